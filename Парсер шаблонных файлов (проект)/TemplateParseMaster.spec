@@ -0,0 +1,73 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Сборка: pyinstaller TemplateParseMaster.spec
+#
+# Программе нужны только tkinter, lxml, pywin32 (буфер обмена) и openpyxl для записи в Excel. Остальное,
+# что PyInstaller подтягивает из окружения разработчика, исключено: это сокращает размер папки сборки и время
+# распаковки при запуске. Проверка времени запуска - bench_startup.py
+#
+# В сборку входит только база настроек; кэш результатов (cache.db) содержит значения из обработанных документов
+# и создается программой при первом запуске, поэтому в datas его нет
+
+block_cipher = None
+
+excludes = [
+    'scipy',
+    'matplotlib',
+    'IPython',
+    'jedi',
+    'parso',
+    'PyQt5',
+    'PyQt6',
+    'PIL',
+    'gevent',
+    'greenlet',
+    'zope',
+    'zmq',
+    'tornado',
+    'docutils',
+    'coverage',
+    'psutil',
+    'regex',
+    'markupsafe',
+    'docx',
+    'pandas',
+    'numpy',
+]
+
+a = Analysis(
+    ['main.py'],
+    pathex=[],
+    binaries=[],
+    datas=[('templates', 'templates'), ('settings.db', '.')],
+    hiddenimports=['openpyxl', 'win32clipboard'],
+    hookspath=[],
+    runtime_hooks=[],
+    excludes=excludes,
+    win_no_prefer_redirects=False,
+    win_private_assemblies=False,
+    cipher=block_cipher,
+    noarchive=False,
+)
+pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='TemplateParseMaster',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=False,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx=False,
+    name='TemplateParseMaster',
+)
@@ -0,0 +1,347 @@
+import hashlib
+import os
+import time
+from itertools import islice
+from typing import NamedTuple, Optional
+from docx_reader import BUFFER_TYPES, read_docx
+from extractor import CompiledTemplate, extract_data, load_template, match_document
+from database import DB_PATH
+from result_cache import document_hash
+from router import AUTO_TEMPLATE, MIN_CONFIDENCE
+
+# Скомпилированные шаблоны и индекс для подбора шаблона процесса-обработчика из пула: передаются один раз при
+# запуске процесса (см. _init_worker). В текущем процессе они не используются: несколько запусков (например,
+# генераторы iter_extract или поток интерфейса рядом с наблюдением за папками) передают свои шаблоны явно
+_worker_templates = {}
+_worker_index = None
+_worker_min_confidence = MIN_CONFIDENCE
+
+
+def _init_worker(compiled_templates, index=None, min_confidence=MIN_CONFIDENCE):
+    global _worker_templates, _worker_index, _worker_min_confidence
+    _worker_templates = compiled_templates
+    _worker_index = index
+    _worker_min_confidence = min_confidence
+
+
+def _route_and_extract(file, compiled_templates, index, min_confidence):
+    """
+    Функция подбирает шаблон для документа и извлекает из него данные: документ читается один раз, подбор шаблона
+    и сопоставление выполняются по уже прочитанным параграфам и таблицам
+    :param file: путь к файлу, его содержимое или файлоподобный объект
+    :param compiled_templates: словарь {ключ шаблона: CompiledTemplate}
+    :param index: объект TemplateIndex с ключами из compiled_templates
+    :param min_confidence: минимальная уверенность подбора шаблона
+
+    :return: кортеж (файл, ключ подобранного шаблона, словарь с данными или None, текст ошибки или None, словарь
+    {этап: время, с})
+    """
+    timings = {}
+    template = AUTO_TEMPLATE
+    try:
+        started = time.perf_counter()
+        file_paragraphs, tables_data = read_docx(file_path=file)
+        read = time.perf_counter()
+        timings['read'] = read - started
+        key, confidence = index.route_document(file_paragraphs=file_paragraphs, tables_data=tables_data)
+        routed = time.perf_counter()
+        timings['route'] = routed - read
+        if key is None or confidence < min_confidence:
+            return file, template, None, f'не удалось подобрать шаблон (уверенность {confidence:.2f})', timings
+        template = key
+        result = match_document(file_paragraphs=file_paragraphs, tables_data=tables_data,
+                                compiled_template=compiled_templates[template])
+        timings['match'] = time.perf_counter() - routed
+        return file, template, result, None, timings
+    except Exception as e:
+        return file, template, None, str(e), timings
+
+
+def _extract_chunk(chunk, compiled_templates, index=None, min_confidence=MIN_CONFIDENCE):
+    """
+    Функция обрабатывает группу заданий
+    :param chunk: список кортежей (файл, ключ шаблона); для ключа AUTO_TEMPLATE шаблон подбирается по индексу
+    :param compiled_templates: словарь {ключ шаблона: CompiledTemplate}
+    :param index: объект TemplateIndex или None (см. run_batch)
+    :param min_confidence: минимальная уверенность подбора шаблона
+
+    :return: список кортежей (файл, ключ шаблона, словарь с данными или None, текст ошибки или None, словарь
+    {этап: время, с})
+    """
+    results = []
+    for file, template in chunk:
+        if template == AUTO_TEMPLATE and index is not None:
+            results.append(_route_and_extract(file=file, compiled_templates=compiled_templates, index=index,
+                                              min_confidence=min_confidence))
+            continue
+        compiled_template = compiled_templates.get(template)
+        if compiled_template is None:
+            results.append((file, template, None, 'шаблон не найден', {}))
+            continue
+        timings = {}
+        try:
+            result = extract_data(file=file, compiled_template=compiled_template, timings=timings)
+            results.append((file, template, result, None, timings))
+        except Exception as e:
+            results.append((file, template, None, str(e), timings))
+    return results
+
+
+def _extract_sent_chunk(chunk):
+    # Группа заданий, переданная в процесс-обработчик: файл не возвращается обратно (содержимое документа не
+    # передается между процессами второй раз), текущий процесс берет его из своей группы заданий
+    return [result[1:] for result in _extract_chunk(chunk, compiled_templates=_worker_templates, index=_worker_index,
+                                                    min_confidence=_worker_min_confidence)]
+
+
+def _sendable(file):
+    """
+    Функция подготавливает документ к передаче в процесс-обработчик: путь и bytes передаются как есть, содержимое
+    в bytearray и memoryview копируется в bytes, файлоподобный объект читается целиком с начала
+    """
+    if isinstance(file, BUFFER_TYPES) and not isinstance(file, bytes):
+        return bytes(file)
+    if hasattr(file, 'read'):
+        position = file.tell()
+        file.seek(0)
+        data = file.read()
+        file.seek(position)
+        return data
+    return file
+
+
+def _job_key(file, template):
+    # Ключ задания для словарей: документ в памяти может быть нехэшируемым (bytearray) или большим, поэтому
+    # для него берется id объекта, который не меняется, пока задание в очереди
+    return (file if isinstance(file, str) else id(file)), template
+
+
+def run_batch(jobs, compiled_templates, workers=None, chunksize=1, ordered=True, cancel=None, result_cache=None,
+              run_metrics=None, index=None, min_confidence=MIN_CONFIDENCE):
+    """
+    Функция извлекает данные из очереди файлов в пуле процессов. Скомпилированные шаблоны передаются в каждый
+    процесс-обработчик один раз при его запуске, в заданиях передается только ключ шаблона
+    :param jobs: список кортежей (файл, ключ шаблона); файл - путь, содержимое документа (bytes, bytearray, memoryview)
+    или файлоподобный объект (см. docx_reader.open_source)
+    :param compiled_templates: словарь {ключ шаблона: CompiledTemplate}; задания с шаблоном, которого нет в словаре,
+    дают ошибку «шаблон не найден»
+    :param index: объект TemplateIndex (см. router.build_index) с ключами из compiled_templates; для заданий с ключом
+    AUTO_TEMPLATE шаблон подбирается в процессе-обработчике по уже прочитанному документу, и в результате
+    выдается ключ подобранного шаблона. Документ, для которого шаблон не подобран, дает ошибку
+    :param min_confidence: минимальная уверенность подбора шаблона (см. TemplateIndex.route_texts)
+    :param workers: количество процессов (по умолчанию - число ядер); при 1 очередь обрабатывается в текущем процессе
+    :param chunksize: количество заданий, передаваемых процессу за раз
+    :param ordered: True - результаты выдаются в порядке очереди, False - по мере готовности
+    :param cancel: объект threading.Event; если он установлен, обработка останавливается перед следующим файлом,
+    еще не начатые группы заданий отменяются
+    :param result_cache: объект ResultCache; если задан, документы, уже обработанные тем же шаблоном, не открываются,
+    а новые результаты сохраняются в кэш
+    :param run_metrics: объект RunMetrics; если задан, в него записывается время этапов каждого документа
+
+    :return: генератор кортежей (файл, ключ шаблона, словарь с данными или None, текст ошибки или None)
+    """
+    router = (index, min_confidence)
+    if result_cache is None:
+        results = _run_jobs(jobs=jobs, compiled_templates=compiled_templates, workers=workers, chunksize=chunksize,
+                            ordered=ordered, cancel=cancel, router=router)
+    else:
+        results = _run_cached(jobs=jobs, compiled_templates=compiled_templates, workers=workers, chunksize=chunksize,
+                              ordered=ordered, cancel=cancel, result_cache=result_cache, router=router)
+
+    try:
+        for file, template, result, error, timings in results:
+            if run_metrics is not None:
+                # Документ из кэша результатов не читается: у него есть только этапы hash и cache
+                run_metrics.add_document(file=file, template=template, stages=timings, error=error,
+                                         cached='cache' in timings and 'read' not in timings)
+            yield file, template, result, error
+    finally:
+        results.close()
+
+
+def _routing_fingerprint(compiled_templates, index, min_confidence):
+    # Хэш подбора шаблона: результат документа, для которого шаблон подбирается автоматически, зависит от всех
+    # шаблонов индекса и минимальной уверенности
+    keys = sorted(key + '\0' + compiled_templates[key].fingerprint() for key in index)
+    key = '\0'.join([AUTO_TEMPLATE, str(index.shingle_size), str(min_confidence)] + keys)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _run_cached(jobs, compiled_templates, workers, chunksize, ordered, cancel, result_cache, router):
+    # Поиск в кэше выполняется в текущем процессе до запуска пула: обработчикам передаются только промахи. Для
+    # задания с автоматическим подбором в кэше хранится и ключ подобранного шаблона: {'template': ..., 'data': ...}
+    jobs = list(jobs)
+    fingerprints = {template: compiled.fingerprint() for template, compiled in compiled_templates.items()}
+    index, min_confidence = router
+    if index is not None:
+        fingerprints[AUTO_TEMPLATE] = _routing_fingerprint(compiled_templates=compiled_templates, index=index,
+                                                           min_confidence=min_confidence)
+    hashes = {}
+    timings = {}
+    cached = {}
+    for number, (file, template) in enumerate(jobs):
+        if cancel is not None and cancel.is_set():
+            return
+        if template not in fingerprints:
+            continue
+        key = _job_key(file=file, template=template)
+        started = time.perf_counter()
+        if key not in hashes:
+            hashes[key] = document_hash(file)
+        hashed = time.perf_counter()
+        if hashes[key] is None:
+            continue
+        result = result_cache.get(document_hash=hashes[key], template_hash=fingerprints[template])
+        timings[key] = {'hash': hashed - started, 'cache': time.perf_counter() - hashed}
+        if result is not None:
+            cached[number] = result
+
+    results = _run_jobs(jobs=[job for number, job in enumerate(jobs) if number not in cached],
+                        compiled_templates=compiled_templates, workers=workers, chunksize=chunksize,
+                        ordered=ordered, cancel=cancel, router=router)
+
+    def store(item):
+        file, template, result, error, stages = item
+        # Документ, шаблон которого подобран в процессе-обработчике, имеет этап route
+        routed = 'route' in stages
+        key = _job_key(file=file, template=AUTO_TEMPLATE if routed else template)
+        if error is None and hashes.get(key) is not None:
+            result_cache.put(document_hash=hashes[key], template_hash=fingerprints[key[1]],
+                             result={'template': template, 'data': result} if routed else result)
+        return file, template, result, error, dict(timings.get(key, {}), **stages)
+
+    def restore(number):
+        file, template = jobs[number]
+        stages = timings[_job_key(file=file, template=template)]
+        result = cached[number]
+        if template == AUTO_TEMPLATE:
+            template, result = result['template'], result['data']
+        return file, template, result, None, stages
+
+    try:
+        if ordered:
+            for number in range(len(jobs)):
+                if number in cached:
+                    if cancel is not None and cancel.is_set():
+                        return
+                    yield restore(number)
+                    continue
+                item = next(results, None)
+                if item is None:
+                    return
+                yield store(item)
+        else:
+            for number in cached:
+                if cancel is not None and cancel.is_set():
+                    return
+                yield restore(number)
+            for item in results:
+                yield store(item)
+    finally:
+        results.close()
+
+
+def _run_jobs(jobs, compiled_templates, workers, chunksize, ordered, cancel, router):
+    # Задания берутся из jobs по мере обработки: процессам передано не больше двух групп заданий на процесс, поэтому
+    # jobs может быть генератором, а потребитель, который не забирает результаты, приостанавливает обработку
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if isinstance(jobs, (list, tuple)):
+        workers = min(workers, len(jobs))
+    workers = max(1, workers)
+    chunksize = max(1, chunksize)
+    jobs = iter(jobs)
+
+    def cancelled():
+        return cancel is not None and cancel.is_set()
+
+    if workers == 1:
+        index, min_confidence = router
+        for file, template in jobs:
+            if cancelled():
+                return
+            yield from _extract_chunk([(file, template)], compiled_templates=compiled_templates, index=index,
+                                      min_confidence=min_confidence)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(compiled_templates,) + tuple(router))
+    # Группы заданий в работе: {future: группа заданий}; словарь сохраняет порядок отправки
+    pending = {}
+
+    def submit():
+        while len(pending) < 2 * workers and not cancelled():
+            chunk = list(islice(jobs, chunksize))
+            if not chunk:
+                return
+            future = executor.submit(_extract_sent_chunk, [(_sendable(file), template) for file, template in chunk])
+            pending[future] = chunk
+
+    try:
+        submit()
+        while pending:
+            if ordered:
+                done = [next(iter(pending))]
+            else:
+                finished = wait(pending, return_when=FIRST_COMPLETED).done
+                done = [future for future in pending if future in finished]
+            chunks = [pending.pop(future) for future in done]
+            submit()
+            for future, chunk in zip(done, chunks):
+                for (file, _), result in zip(chunk, future.result()):
+                    if cancelled():
+                        return
+                    yield (file,) + result
+    finally:
+        # Отменяем группы заданий, которые еще не переданы процессам, и дожидаемся уже начатых
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+class ExtractionResult(NamedTuple):
+    """
+    Результат извлечения данных из одного документа (см. iter_extract)
+    """
+    # Документ в том виде, в котором он передан в iter_extract: путь, содержимое или файлоподобный объект
+    file: object
+    template: str
+    # Словарь вида {VARIABLE_NAME: VARIABLE_VALUE} или None при ошибке
+    data: Optional[dict]
+    # Текст ошибки или None
+    error: Optional[str]
+
+
+def iter_extract(paths, template, separator_left=None, separator_right=None, workers=1, chunksize=1, ordered=True,
+                 cancel=None, db_path=DB_PATH, result_cache=None, run_metrics=None):
+    """
+    Функция извлекает данные из документов по одному шаблону и выдает результаты по мере обработки, ничего не
+    записывая на диск. Документы берутся из paths лениво, а в работе одновременно находится ограниченное число
+    документов, поэтому paths может быть бесконечным генератором (например, из очереди сообщений), а обработка
+    приостанавливается, пока потребитель не заберет очередной результат
+    :param paths: итерируемый объект с путями к файлам Word, их содержимым (bytes, bytearray, memoryview) или
+    файлоподобными объектами с поддержкой seek - документ из памяти не записывается во временный файл
+    :param template: путь к файлу-шаблону или объект CompiledTemplate
+    :param separator_left: сепаратор слева от метки (по умолчанию - из базы настроек или "<")
+    :param separator_right: сепаратор справа от метки (по умолчанию - из базы настроек или ">")
+    :param workers: количество процессов; при 1 (по умолчанию) документы обрабатываются в текущем процессе
+    :param chunksize: количество файлов, передаваемых процессу за раз
+    :param ordered: True - результаты выдаются в порядке paths, False - по мере готовности
+    :param cancel: объект threading.Event для остановки
+    :param db_path: путь к базе настроек; None - не использовать базу
+    :param result_cache: объект ResultCache или None; с кэшем результатов paths читается целиком до начала обработки
+    :param run_metrics: объект RunMetrics или None (см. run_batch)
+
+    :return: генератор объектов ExtractionResult
+    """
+    if not isinstance(template, CompiledTemplate):
+        template = load_template(path=template, separator_left=separator_left, separator_right=separator_right,
+                                 db_path=db_path)
+
+    jobs = ((path, template.path) for path in paths)
+    for file, key, result, error in run_batch(jobs=jobs, compiled_templates={template.path: template},
+                                              workers=workers, chunksize=chunksize, ordered=ordered, cancel=cancel,
+                                              result_cache=result_cache, run_metrics=run_metrics):
+        yield ExtractionResult(file=file, template=key, data=result, error=error)
@@ -0,0 +1,137 @@
+"""
+Замер сопоставления уже прочитанного документа с шаблоном на синтетических данных (таблица на несколько тысяч ячеек
+и сотни параграфов): прежняя обработка со списками без повторов и проверками key not in list(dict.keys()) против
+текущей match_document на словарях:
+
+    python bench_merge.py
+    python bench_merge.py --rows 200 --cols 20 --paragraphs 1000
+"""
+import argparse
+import timeit
+
+from extractor import CompiledLine, CompiledTemplate, match_document
+
+
+def legacy_match_document(file_paragraphs, tables_data, compiled_template):
+    # Прежняя реализация extract_data (первая таблица, параграфы по порядковому номеру) без чтения файла
+    try:
+        template_tables_data = compiled_template.tables
+        tables = list(tables_data.keys())
+        template_tables = list(template_tables_data.keys())
+        table_values = []
+        table_variables = []
+        tt = []
+        t = []
+        for key in tables:
+            t.append(tables_data[key])
+            for k in list(tables_data[key].keys()):
+                if tables_data[key][k] != '' and tables_data[key][k] not in table_values:
+                    table_values.append(tables_data[key][k])
+        for key in template_tables:
+            tt.append(template_tables_data[key])
+            for k in list(template_tables_data[key].keys()):
+                if template_tables_data[key][k].template != '' and template_tables_data[key][
+                    k].template not in table_variables:
+                    table_variables.append(template_tables_data[key][k].template)
+        pre_table_data = []
+        for h in list(t[0].keys()):
+            if t[0][h] != '' and tt[0][h].template != '':
+                pre_table_data.append(tt[0][h].match(t[0][h]))
+        table_data = []
+        for item in pre_table_data:
+            if item != {}:
+                table_data.append(item)
+        merged_table_data = {}
+        for d in table_data:
+            merged_table_data.update(d)
+    except:
+        merged_table_data = {}
+
+    try:
+        template_paragraphs = compiled_template.paragraphs
+        i = 0
+        pre_data = []
+        while i < len(file_paragraphs):
+            pre_data.append(template_paragraphs[i].match(file_paragraphs[i]))
+            i += 1
+        data = []
+        abz_result = {}
+        for item in pre_data:
+            if item != {}:
+                data.append(item)
+        for item in data:
+            keys = list(item.keys())
+            for key in keys:
+                if key not in list(abz_result.keys()):
+                    abz_result[key] = item[key]
+    except:
+        abz_result = {}
+
+    return {**merged_table_data, **abz_result}
+
+
+def make_case(rows, cols, paragraphs):
+    """
+    Функция строит синтетический шаблон и документ: в таблице каждая вторая ячейка содержит метку, каждый второй
+    параграф - метку, остальные - статичный текст
+
+    :return: кортеж (параграфы документа, таблицы документа, CompiledTemplate)
+    """
+    template_cells = {}
+    file_cells = {}
+    for row in range(1, rows + 1):
+        for col in range(1, cols + 1):
+            coordinates = f'{row}*{col}'
+            if col % 2:
+                template_cells[coordinates] = f'Ячейка {coordinates}'
+                file_cells[coordinates] = f'Ячейка {coordinates}'
+            else:
+                template_cells[coordinates] = f'Сумма: <CELL_{row}_{col}> руб.'
+                file_cells[coordinates] = f'Сумма: {row * col} руб.'
+
+    template_paragraphs = []
+    file_paragraphs = []
+    for index in range(paragraphs):
+        if index % 2:
+            template_paragraphs.append(f'Пункт {index}: <ITEM_{index}>, далее по тексту')
+            file_paragraphs.append(f'Пункт {index}: значение {index}, далее по тексту')
+        else:
+            template_paragraphs.append(f'Статичный абзац номер {index}.')
+            file_paragraphs.append(f'Статичный абзац номер {index}.')
+
+    compiled_template = CompiledTemplate.restore(
+        path='synthetic', separator_left='<', separator_right='>', content_hash='',
+        paragraphs=[CompiledLine(template=text, separator_left='<', separator_right='>')
+                    for text in template_paragraphs],
+        tables={1: {coordinates: CompiledLine(template=text, separator_left='<', separator_right='>')
+                    for coordinates, text in template_cells.items()}})
+    return file_paragraphs, {1: file_cells}, compiled_template
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замер сопоставления документа с шаблоном')
+    parser.add_argument('--rows', type=int, default=100, help='строк в таблице')
+    parser.add_argument('--cols', type=int, default=20, help='столбцов в таблице')
+    parser.add_argument('--paragraphs', type=int, default=500, help='количество параграфов')
+    parser.add_argument('--number', type=int, default=5, help='количество повторов')
+    args = parser.parse_args(argv)
+
+    file_paragraphs, tables_data, compiled_template = make_case(rows=args.rows, cols=args.cols,
+                                                                paragraphs=args.paragraphs)
+    old = legacy_match_document(file_paragraphs, tables_data, compiled_template)
+    new = match_document(file_paragraphs=file_paragraphs, tables_data=tables_data,
+                         compiled_template=compiled_template)
+    old_time = timeit.timeit(lambda: legacy_match_document(file_paragraphs, tables_data, compiled_template),
+                             number=args.number) / args.number
+    new_time = timeit.timeit(lambda: match_document(file_paragraphs=file_paragraphs, tables_data=tables_data,
+                                                    compiled_template=compiled_template),
+                             number=args.number) / args.number
+
+    print(f'Ячеек: {args.rows * args.cols}, параграфов: {args.paragraphs}, меток: {len(compiled_template.tags)}')
+    print(f'  списки:  {old_time * 1e3:9.2f} мс')
+    print(f'  словари: {new_time * 1e3:9.2f} мс  (x{old_time / new_time:.1f})')
+    print(f'  результаты совпадают: {"да" if old == new else "нет"}')
+
+
+if __name__ == '__main__':
+    main()
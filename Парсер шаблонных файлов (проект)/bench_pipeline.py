@@ -0,0 +1,326 @@
+"""
+Замер пропускной способности извлечения на синтетических корпусах, построенных из файлов-шаблонов (по умолчанию -
+из каждого шаблона папки templates). Для каждого шаблона и профиля корпуса измеряются стадии (распаковка, разбор XML,
+сопоставление с шаблоном, запись результатов), документов в секунду, задержка на документ (p50/p99) и пиковый RSS.
+Каждый профиль обрабатывается в отдельном процессе, чтобы построение корпуса и предыдущие профили не влияли на замер
+памяти. Результаты можно сохранить как базовые и сравнивать с ними последующие замеры:
+
+    python bench_pipeline.py
+    python bench_pipeline.py --profiles small large --scale 0.5
+    python bench_pipeline.py --template "templates/Образец shablon.docx"
+    python bench_pipeline.py --save-baseline bench_baseline.json
+    python bench_pipeline.py --baseline bench_baseline.json --tolerance 15
+"""
+import argparse
+import io
+import json
+import os
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+from docx_reader import W, collect_document, iter_document_part, main_part_name
+from extractor import CompiledTemplate, match_document
+from writers import RunWriter, parse_formats
+
+# Профили корпуса: количество документов и способ увеличения шаблона
+profiles = {
+    'small': {'documents': 200},
+    'large': {'documents': 20, 'repeat_body': 20},
+    'table-heavy': {'documents': 20, 'repeat_tables': 20},
+    '10k-paragraph': {'documents': 3, 'paragraphs': 10000},
+}
+
+stages = ['unzip', 'parse', 'match', 'write']
+
+
+def find_templates():
+    """
+    Функция возвращает пути к файлам-шаблонам из папки templates рядом со скриптом
+    """
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.endswith('.docx') and not name.startswith('~$')]
+
+
+def peak_rss():
+    """
+    Функция возвращает пиковый размер резидентной памяти текущего процесса в МБ или None, если его не узнать
+    """
+    # В Linux VmHWM относится к текущей программе, а ru_maxrss после exec сохраняет пик родительского процесса
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def _collapse_runs(paragraph, tag_pattern, fill=None):
+    # Текст параграфа с меткой переносится в первый w:t: метка, разбитая Word на несколько прогонов, становится
+    # целой. Так же обрабатываются и шаблон корпуса, и документы, поэтому их параграфы соответствуют друг другу
+    texts = paragraph.findall('.//' + W + 't')
+    text = ''.join(t.text or '' for t in texts)
+    if not texts or not tag_pattern.search(text):
+        return
+    if fill is not None:
+        text = tag_pattern.sub(fill, text)
+    texts[0].text = text
+    texts[0].set('{http://www.w3.org/XML/1998/namespace}space', 'preserve')
+    for t in texts[1:]:
+        t.text = ''
+
+
+def _build_body(template_xml, profile):
+    # Возвращает дерево основной части шаблона, увеличенное по профилю
+    from lxml import etree
+    import copy
+
+    root = etree.fromstring(template_xml)
+    body = root.find(W + 'body')
+    content = [element for element in body if element.tag != W + 'sectPr']
+    section = body.find(W + 'sectPr')
+
+    additions = []
+    if profile.get('repeat_body'):
+        additions = [copy.deepcopy(element) for _ in range(profile['repeat_body'] - 1) for element in content]
+    elif profile.get('repeat_tables'):
+        tables = [element for element in content if element.tag == W + 'tbl']
+        for _ in range(profile['repeat_tables'] - 1):
+            for table in tables:
+                # Между таблицами - пустой параграф, иначе Word объединяет соседние таблицы
+                additions.append(etree.Element(W + 'p'))
+                additions.append(copy.deepcopy(table))
+    elif profile.get('paragraphs'):
+        paragraphs = [element for element in content if element.tag == W + 'p'] or [etree.Element(W + 'p')]
+        count = len(paragraphs)
+        while count < profile['paragraphs']:
+            additions.extend(copy.deepcopy(paragraph) for paragraph in paragraphs)
+            count += len(paragraphs)
+
+    for element in additions:
+        if section is not None:
+            section.addprevious(element)
+        else:
+            body.append(element)
+    return root
+
+
+def _write_docx(source, destination, part_name, xml):
+    with zipfile.ZipFile(source) as archive, zipfile.ZipFile(destination, 'w', zipfile.ZIP_DEFLATED) as result:
+        for item in archive.infolist():
+            result.writestr(item, xml if item.filename == part_name else archive.read(item.filename))
+
+
+def generate_corpus(template, directory, profile, documents, separator_left='<', separator_right='>', seed=0):
+    """
+    Функция строит синтетический корпус: шаблон, увеличенный по профилю, и документы, в которых метки шаблона
+    заменены случайными значениями
+    :param template: путь к исходному файлу-шаблону
+    :param directory: папка корпуса (создается)
+    :param profile: словарь профиля (см. profiles)
+    :param documents: количество документов
+    :param separator_left: сепаратор слева от метки
+    :param separator_right: сепаратор справа от метки
+    :param seed: начальное значение генератора случайных чисел
+
+    :return: кортеж (путь к шаблону корпуса, список путей к документам)
+    """
+    from lxml import etree
+
+    os.makedirs(directory, exist_ok=True)
+    tag_pattern = re.compile(rf'{re.escape(separator_left)}(.*?){re.escape(separator_right)}')
+    random_values = random.Random(seed)
+
+    with zipfile.ZipFile(template) as archive:
+        part_name = main_part_name(archive)
+        template_xml = archive.read(part_name)
+
+    root = _build_body(template_xml=template_xml, profile=profile)
+    paragraphs = list(root.iter(W + 'p'))
+    for paragraph in paragraphs:
+        _collapse_runs(paragraph=paragraph, tag_pattern=tag_pattern)
+    corpus_template = os.path.join(directory, 'template.docx')
+    _write_docx(source=template, destination=corpus_template, part_name=part_name, xml=etree.tostring(root))
+
+    def fill(match):
+        return f'{match.group(1)[:3]}{random_values.randint(1, 10 ** 6)}'
+
+    files = []
+    for index in range(documents):
+        document = _build_body(template_xml=template_xml, profile=profile)
+        for paragraph in document.iter(W + 'p'):
+            _collapse_runs(paragraph=paragraph, tag_pattern=tag_pattern, fill=fill)
+        file = os.path.join(directory, f'document_{index:05}.docx')
+        _write_docx(source=template, destination=file, part_name=part_name, xml=etree.tostring(document))
+        files.append(file)
+    return corpus_template, files
+
+
+def run_profile(corpus_template, files, out, formats, separator_left='<', separator_right='>'):
+    """
+    Функция обрабатывает корпус в текущем процессе, замеряя каждую стадию для каждого документа
+
+    :return: словарь с показателями (см. summarize)
+    """
+    compiled_template = CompiledTemplate(path=corpus_template, separator_left=separator_left,
+                                         separator_right=separator_right)
+    totals = dict.fromkeys(stages, 0.0)
+    latencies = []
+
+    started = time.perf_counter()
+    with RunWriter(path=os.path.join(out, 'results'), fieldnames=compiled_template.tags, formats=formats) as writer:
+        for file in files:
+            t0 = time.perf_counter()
+            with zipfile.ZipFile(file) as archive:
+                xml = archive.read(main_part_name(archive))
+            t1 = time.perf_counter()
+            file_paragraphs, tables_data = collect_document(iter_document_part(io.BytesIO(xml)))
+            t2 = time.perf_counter()
+            result = match_document(file_paragraphs=file_paragraphs, tables_data=tables_data,
+                                    compiled_template=compiled_template)
+            t3 = time.perf_counter()
+            writer.write(file=file, data=result)
+            t4 = time.perf_counter()
+
+            for stage, elapsed in zip(stages, (t1 - t0, t2 - t1, t3 - t2, t4 - t3)):
+                totals[stage] += elapsed
+            latencies.append(t4 - t0)
+        closing = time.perf_counter()
+    totals['write'] += time.perf_counter() - closing
+    elapsed = time.perf_counter() - started
+
+    return summarize(documents=len(files), elapsed=elapsed, totals=totals, latencies=latencies)
+
+
+def summarize(documents, elapsed, totals, latencies):
+    """
+    Функция сводит замеры профиля
+
+    :return: словарь {'documents', 'seconds', 'docs_per_sec', 'p50_ms', 'p99_ms', 'peak_rss_mb',
+    'stages_ms': {стадия: суммарное время}}
+    """
+    latencies = sorted(latencies)
+    rss = peak_rss()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0
+    return {
+        'documents': documents,
+        'seconds': round(elapsed, 4),
+        'docs_per_sec': round(documents / elapsed, 2) if elapsed > 0 else 0.0,
+        'p50_ms': round(statistics.median(latencies) * 1000, 3) if latencies else 0.0,
+        'p99_ms': round(p99 * 1000, 3),
+        'peak_rss_mb': round(rss, 1) if rss is not None else None,
+        'stages_ms': {stage: round(total * 1000, 2) for stage, total in totals.items()},
+    }
+
+
+def measure(directory, formats):
+    """
+    Функция обрабатывает готовый корпус в новом процессе (см. --measure)
+
+    :return: словарь с показателями (см. summarize)
+    """
+    command = [sys.executable, os.path.abspath(__file__), '--measure', directory, '--format', ','.join(formats)]
+    process = subprocess.run(command, cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip())
+    return json.loads(process.stdout)
+
+
+def print_report(name, metrics, baseline=None):
+    stages_total = sum(metrics['stages_ms'].values()) or 1
+    rss = f'{metrics["peak_rss_mb"]:.1f} МБ' if metrics['peak_rss_mb'] is not None else 'н/д'
+    print(f'{name}: {metrics["documents"]} док., {metrics["docs_per_sec"]:.1f} док/с, '
+          f'p50 {metrics["p50_ms"]:.2f} мс, p99 {metrics["p99_ms"]:.2f} мс, пиковый RSS {rss}')
+    print('  ' + ', '.join(f'{stage} {total:.1f} мс ({total / stages_total:.0%})'
+                           for stage, total in metrics['stages_ms'].items()))
+    if baseline is not None:
+        change = (metrics['docs_per_sec'] - baseline['docs_per_sec']) / baseline['docs_per_sec'] * 100
+        print(f'  относительно базового замера: {baseline["docs_per_sec"]:.1f} док/с -> {change:+.1f}%')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замер пропускной способности извлечения на синтетическом корпусе')
+    parser.add_argument('--template', help='файл-шаблон, из которого строится корпус (по умолчанию - каждый шаблон '
+                                           'из папки templates)')
+    parser.add_argument('--profiles', nargs='+', choices=list(profiles), default=list(profiles),
+                        help='профили корпуса')
+    parser.add_argument('--scale', type=float, default=1.0, help='множитель количества документов')
+    parser.add_argument('--format', default='csv,json', help='форматы результатов через запятую')
+    parser.add_argument('--corpus', help='папка для корпуса (по умолчанию - временная, удаляется после замера)')
+    parser.add_argument('--seed', type=int, default=0, help='начальное значение генератора значений меток')
+    parser.add_argument('--save-baseline', help='сохранить результаты как базовые в JSON-файл')
+    parser.add_argument('--baseline', help='сравнить с базовыми результатами из JSON-файла')
+    parser.add_argument('--tolerance', type=float, default=20,
+                        help='допустимое падение док/с относительно базового замера, %%')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    formats = parse_formats(args.format)
+    if args.measure:
+        # Замер одного профиля в отдельном процессе: результат печатается в stdout в JSON
+        files = sorted(os.path.join(args.measure, name) for name in os.listdir(args.measure)
+                       if name.startswith('document_'))
+        out = os.path.join(args.measure, 'out')
+        os.makedirs(out, exist_ok=True)
+        print(json.dumps(run_profile(corpus_template=os.path.join(args.measure, 'template.docx'), files=files,
+                                     out=out, formats=formats)))
+        return 0
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    templates = [args.template] if args.template else find_templates()
+    work = args.corpus or tempfile.mkdtemp(prefix='bench_pipeline_')
+    # Результаты и базовые замеры: ключ - "имя шаблона/профиль"
+    results = {}
+    failed = False
+    try:
+        for number, template in enumerate(templates):
+            for name in args.profiles:
+                profile = profiles[name]
+                key = f'{os.path.splitext(os.path.basename(template))[0]}/{name}'
+                directory = os.path.join(work, str(number), name)
+                generate_corpus(template=template, directory=directory, profile=profile,
+                                documents=max(1, round(profile['documents'] * args.scale)), seed=args.seed)
+                results[key] = measure(directory=directory, formats=formats)
+
+                print_report(name=key, metrics=results[key], baseline=baseline.get(key))
+                if key in baseline:
+                    allowed = baseline[key]['docs_per_sec'] * (1 - args.tolerance / 100)
+                    if results[key]['docs_per_sec'] < allowed:
+                        print(f'  ПАДЕНИЕ больше {args.tolerance:.0f}%')
+                        failed = True
+    finally:
+        if not args.corpus:
+            shutil.rmtree(work, ignore_errors=True)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Замер холодного запуска по python -X importtime. Завершается с кодом 1, если точку входа не удалось импортировать,
+время ее импорта превышает бюджет или при запуске загружается тяжелый модуль, который должен импортироваться лениво:
+
+    python bench_startup.py
+    python bench_startup.py --repeat 10 --budget-cli 80 --budget-main 120
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Модули, которые при запуске не загружаются: pandas - только при записи в Excel, lxml - при первом чтении
+# документа, пул процессов - при запуске пакетной обработки
+deferred_modules = ['pandas', 'numpy', 'openpyxl', 'lxml', 'docx', 'concurrent.futures.process', 'win32clipboard']
+
+# Точки входа: модуль и бюджет времени импорта по умолчанию, мс
+entry_points = {
+    'cli': 60,
+    'main': 100,
+}
+
+
+def measure(module):
+    """
+    Функция импортирует модуль в новом процессе с -X importtime
+    :param module: имя модуля
+
+    :return: кортеж (суммарное время импорта модуля в мкс, множество всех загруженных модулей)
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                             cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+
+    total = None
+    imported = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imported.add(name.strip())
+        if name.strip() == module:
+            total = int(cumulative)
+    return total, imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бюджет времени холодного запуска')
+    parser.add_argument('--repeat', type=int, default=5, help='количество замеров (берется лучший)')
+    for module, budget in entry_points.items():
+        parser.add_argument(f'--budget-{module}', type=float, default=budget,
+                            help=f'бюджет импорта {module}, мс (по умолчанию {budget})')
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in entry_points:
+        budget = getattr(args, f'budget_{module}')
+        try:
+            results = [measure(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f'{module}: не удалось импортировать ({e}) - ОШИБКА')
+            failed = True
+            continue
+
+        best = min(total for total, _ in results) / 1000
+        loaded = sorted(name for name in deferred_modules if name in results[0][1])
+
+        status = 'OK'
+        if best > budget or loaded:
+            status = 'ПРЕВЫШЕН'
+            failed = True
+        print(f'{module}: {best:.1f} мс (бюджет {budget:.0f} мс) - {status}')
+        if loaded:
+            print(f'  при запуске загружены отложенные модули: {", ".join(loaded)}')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""
+Пакетное извлечение данных без графического интерфейса (не импортирует tkinter и pywin32):
+
+    python cli.py extract --template "templates/Образец shablon.docx" --input docs --out results --format json,csv
+    python cli.py watch --map "incoming=templates/Образец shablon.docx" --out results --format json
+"""
+import argparse
+import os
+import sys
+import time
+from extractor import load_template
+from batch import run_batch
+from writers import RunWriter, parse_formats, write_result
+from database import get_watch_directories, save_watch_directory, delete_watch_directory
+from result_cache import ResultCache
+from metrics import RunMetrics
+from watch import watch_cycle
+from router import AUTO_TEMPLATE, MIN_CONFIDENCE, build_index
+
+
+def collect_files(paths):
+    """
+    Функция возвращает список файлов .docx: пути к файлам берутся как есть, папки просматриваются без вложенных папок
+    :param paths: список путей к файлам и папкам
+
+    :return: список путей к файлам
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for file in sorted(os.listdir(path)):
+                if file.endswith('.docx') and not file.startswith('~$'):
+                    files.append(os.path.join(path, file))
+        else:
+            files.append(path)
+    return files
+
+
+def resolve_template(template):
+    """
+    Функция возвращает путь к файлу-шаблону: путь берется как есть, а если такого файла нет - ищется в папке templates
+    """
+    if not os.path.exists(template) and os.path.exists(os.path.join('templates', template)):
+        template = 'templates/' + template
+    return template
+
+
+def run_profiled(handler, args):
+    """
+    Функция выполняет команду, а при --profile - под профилировщиком (см. profiling.py): файлы профиля записываются
+    в папку результатов. Для профилирования обработка выполняется в текущем процессе, без пула процессов
+    :param handler: функция команды
+    :param args: аргументы командной строки
+
+    :return: код завершения команды
+    """
+    if not args.profile:
+        return handler(args)
+
+    from profiling import Profiler
+
+    args.workers = 1
+    directory = args.out or '.'
+    os.makedirs(directory, exist_ok=True)
+    with Profiler(path=os.path.join(directory, getattr(args, 'name', args.command)), top=args.profile_top) as profiler:
+        code = handler(args)
+    print('Файлы профиля:', ', '.join(profiler.files))
+    return code
+
+
+def extract(args):
+    try:
+        formats = parse_formats(args.format)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    if not args.template and not os.path.exists(args.db):
+        print(f'Без --template шаблоны подбираются из базы настроек, но файл {args.db} не найден', file=sys.stderr)
+        return 2
+
+    # Метрики запуска включают загрузку шаблонов и их подбор для файлов
+    run_metrics = RunMetrics(path=args.metrics) if args.metrics or args.stats else None
+
+    files = collect_files(args.input)
+    index = None
+    if args.template:
+        template = resolve_template(args.template)
+        compiled_templates = {template: load_template(path=template, separator_left=args.separator_left,
+                                                      separator_right=args.separator_right, db_path=args.db)}
+    else:
+        # Шаблон подбирается по индексу зарегистрированных шаблонов (см. router.py) в процессе-обработчике, который
+        # читает документ один раз и для подбора, и для извлечения
+        template = AUTO_TEMPLATE
+        index, compiled_templates = build_index(db_path=args.db)
+    jobs = [(file, template) for file in files]
+    failed = 0
+
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+
+    run_writer = None
+    if not args.per_file:
+        # При подборе шаблона столбцы сводной таблицы - метки всех зарегистрированных шаблонов
+        fieldnames = [tag for compiled in compiled_templates.values() for tag in compiled.tags]
+        run_writer = RunWriter(path=os.path.join(args.out or '.', args.name), fieldnames=list(dict.fromkeys(fieldnames)),
+                               formats=formats)
+
+    result_cache = None
+    if not args.no_cache:
+        result_cache = ResultCache(path=args.cache_db, max_bytes=args.cache_size * 1024 * 1024)
+
+    try:
+        for file, _, result, error in run_batch(jobs=jobs, compiled_templates=compiled_templates,
+                                                workers=args.workers, chunksize=args.chunksize,
+                                                ordered=not args.unordered, result_cache=result_cache,
+                                                run_metrics=run_metrics, index=index,
+                                                min_confidence=args.min_confidence):
+            if error is not None:
+                print(f'Не удалось обработать файл {file}: {error}', file=sys.stderr)
+                failed += 1
+                continue
+
+            # Ошибка записи результатов одного файла не прерывает обработку остальных
+            try:
+                if run_writer is not None:
+                    run_writer.write(file=file, data=result)
+                else:
+                    name = os.path.splitext(os.path.basename(file))[0]
+                    write_result(data=result, path=os.path.join(args.out or os.path.dirname(file), name),
+                                 formats=formats)
+            except Exception as e:
+                print(f'Не удалось записать результаты файла {file}: {e}', file=sys.stderr)
+                failed += 1
+    finally:
+        if run_writer is not None:
+            run_writer.close()
+        if run_metrics is not None:
+            run_metrics.close()
+
+    print(f'Обработано файлов: {len(files) - failed}, с ошибкой: {failed}')
+    if result_cache is not None:
+        print(f'Кэш результатов: попаданий {result_cache.hits}, промахов {result_cache.misses}')
+    if args.stats:
+        print(run_metrics.summary())
+    return 1 if failed else 0
+
+
+def watch(args):
+    for mapping in args.map:
+        directory, separator, template = mapping.partition('=')
+        if not separator or not os.path.isdir(directory):
+            print(f'Неверное назначение папке шаблона (нужно ПАПКА=ШАБЛОН): {mapping}', file=sys.stderr)
+            return 2
+        save_watch_directory(directory=os.path.abspath(directory), template=resolve_template(template), path=args.db)
+    for directory in args.remove:
+        delete_watch_directory(directory=os.path.abspath(directory), path=args.db)
+
+    directories = get_watch_directories(path=args.db)
+    if not directories:
+        print('Нет папок для наблюдения: назначьте папке шаблон через --map ПАПКА=ШАБЛОН', file=sys.stderr)
+        return 2
+
+    try:
+        formats = parse_formats(args.format)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    compiled_templates = {template: load_template(path=template, separator_left=args.separator_left,
+                                                  separator_right=args.separator_right, db_path=args.db)
+                          for template in set(template for _, template in directories)}
+    result_cache = None if args.no_cache else ResultCache(path=args.cache_db, max_bytes=args.cache_size * 1024 * 1024)
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+
+    def on_result(file, result, error):
+        # Файл с ошибкой извлечения записывается в манифест, а файл, результаты которого не записаны, - нет:
+        # он будет обработан в следующем цикле
+        if error is not None:
+            print(f'Не удалось обработать файл {file}: {error}', file=sys.stderr)
+            return True
+        name = os.path.splitext(os.path.basename(file))[0]
+        try:
+            write_result(data=result, path=os.path.join(args.out or os.path.dirname(file), name), formats=formats)
+        except Exception as e:
+            print(f'Не удалось записать результаты файла {file}: {e}', file=sys.stderr)
+            return False
+        print(f'Обработан файл {file}')
+        return True
+
+    try:
+        while True:
+            # Метрики каждого цикла дописываются в тот же файл: строки документов и итог цикла
+            run_metrics = RunMetrics(path=args.metrics, mode='a') if args.metrics or args.stats else None
+            try:
+                processed = watch_cycle(compiled_templates=compiled_templates, on_result=on_result, db_path=args.db,
+                                        workers=args.workers, chunksize=args.chunksize, result_cache=result_cache,
+                                        run_metrics=run_metrics)
+            finally:
+                if run_metrics is not None:
+                    run_metrics.close()
+            if args.stats and processed:
+                print(run_metrics.summary())
+            if args.once:
+                return 0
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='cli.py', description='Извлечение данных из файлов Word по шаблону')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    extract_parser = subparsers.add_parser('extract', help='извлечь данные из файлов по шаблону')
+    extract_parser.add_argument('--template', help='путь к файлу-шаблону или его имя в папке templates (по умолчанию - '
+                                                   'подбирается для каждого файла из шаблонов в settings.db)')
+    extract_parser.add_argument('--min-confidence', type=float, default=MIN_CONFIDENCE,
+                                help='минимальная уверенность автоматического подбора шаблона, от 0 до 1')
+    extract_parser.add_argument('--input', required=True, nargs='+', help='файлы .docx и/или папки с ними')
+    extract_parser.add_argument('--out', help='папка для результатов (по умолчанию - текущая папка, а при --per-file - '
+                                              'рядом с исходным файлом)')
+    extract_parser.add_argument('--format', default='csv,xlsx,json', help='форматы результатов через запятую')
+    extract_parser.add_argument('--name', default='results', help='имя сводных файлов результатов (без расширения)')
+    extract_parser.add_argument('--per-file', action='store_true',
+                                help='записывать результаты каждого документа в отдельные файлы вместо сводных')
+    extract_parser.add_argument('--separator-left', help='сепаратор слева от метки (по умолчанию - из settings.db или "<")')
+    extract_parser.add_argument('--separator-right', help='сепаратор справа от метки (по умолчанию - из settings.db или ">")')
+    extract_parser.add_argument('--db', default='settings.db', help='путь к базе настроек')
+    extract_parser.add_argument('--workers', type=int, help='количество процессов (по умолчанию - число ядер)')
+    extract_parser.add_argument('--chunksize', type=int, default=8, help='количество файлов, передаваемых процессу за раз')
+    extract_parser.add_argument('--unordered', action='store_true', help='обрабатывать результаты по мере готовности')
+    extract_parser.add_argument('--no-cache', action='store_true',
+                                help='не использовать кэш результатов (обработать все файлы заново)')
+    extract_parser.add_argument('--cache-db', default='cache.db', help='путь к базе кэша результатов')
+    extract_parser.add_argument('--cache-size', type=int, default=64, help='размер кэша результатов, МБ')
+    extract_parser.add_argument('--metrics', help='файл .jsonl для метрик: время этапов каждого документа и итог запуска')
+    extract_parser.add_argument('--stats', action='store_true', help='вывести сводную таблицу времени этапов')
+    extract_parser.set_defaults(handler=extract)
+
+    watch_parser = subparsers.add_parser('watch', help='обрабатывать новые и измененные файлы в папках с назначенным '
+                                                       'шаблоном')
+    watch_parser.add_argument('--map', action='append', default=[], metavar='ПАПКА=ШАБЛОН',
+                              help='назначить папке шаблон (сохраняется в базе настроек; можно указать несколько раз)')
+    watch_parser.add_argument('--remove', action='append', default=[], metavar='ПАПКА',
+                              help='прекратить наблюдение за папкой')
+    watch_parser.add_argument('--once', action='store_true', help='выполнить один цикл и завершиться')
+    watch_parser.add_argument('--interval', type=float, default=10, help='пауза между циклами, с')
+    watch_parser.add_argument('--out', help='папка для результатов (по умолчанию - рядом с исходным файлом)')
+    watch_parser.add_argument('--format', default='csv,xlsx,json', help='форматы результатов через запятую')
+    watch_parser.add_argument('--separator-left', help='сепаратор слева от метки (по умолчанию - из settings.db или "<")')
+    watch_parser.add_argument('--separator-right', help='сепаратор справа от метки (по умолчанию - из settings.db или ">")')
+    watch_parser.add_argument('--db', default='settings.db', help='путь к базе настроек')
+    watch_parser.add_argument('--workers', type=int, help='количество процессов (по умолчанию - число ядер)')
+    watch_parser.add_argument('--chunksize', type=int, default=8, help='количество файлов, передаваемых процессу за раз')
+    watch_parser.add_argument('--no-cache', action='store_true', help='не использовать кэш результатов')
+    watch_parser.add_argument('--cache-db', default='cache.db', help='путь к базе кэша результатов')
+    watch_parser.add_argument('--cache-size', type=int, default=64, help='размер кэша результатов, МБ')
+    watch_parser.add_argument('--metrics', help='файл .jsonl, в который дописываются метрики каждого цикла')
+    watch_parser.add_argument('--stats', action='store_true',
+                              help='выводить сводную таблицу времени этапов после цикла с обработанными файлами')
+    watch_parser.set_defaults(handler=watch)
+
+    for subparser in (extract_parser, watch_parser):
+        subparser.add_argument('--profile', action='store_true',
+                               help='профилировать запуск (cProfile и tracemalloc) в текущем процессе и записать '
+                                    'файлы .prof, .snapshot и сводку .profile.txt в папку результатов')
+        subparser.add_argument('--profile-top', type=int, default=20,
+                               help='количество функций и мест выделения памяти в сводке профиля')
+
+    args = parser.parse_args(argv)
+    return run_profiled(handler=args.handler, args=args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
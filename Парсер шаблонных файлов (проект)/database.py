@@ -0,0 +1,346 @@
+import os
+import sqlite3
+import threading
+import time
+from metrics import measured
+
+DB_PATH = 'settings.db'
+
+# Кэш результатов извлечения хранится отдельно от базы настроек: в нем значения из обработанных документов, поэтому
+# он не добавляется в репозиторий (.gitignore) и в сборку (TemplateParseMaster.spec)
+CACHE_PATH = 'cache.db'
+
+# Соединения с базой настроек: одно долгоживущее соединение на поток (sqlite3 не разрешает использовать соединение
+# из другого потока) и на процесс (после fork соединение родителя использовать нельзя)
+_local = threading.local()
+
+
+def _migration_templates_primary_key(conn):
+    # Таблица templates без ключа превращается в таблицу с первичным ключом по пути к шаблону; из повторяющихся
+    # строк остается последняя добавленная
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'templates'").fetchone()
+    conn.execute('''CREATE TABLE templates_new (template TEXT PRIMARY KEY, separator_left TEXT,
+                    separator_right TEXT)''')
+    if exists:
+        conn.execute('''INSERT OR REPLACE INTO templates_new (template, separator_left, separator_right)
+                        SELECT template, separator_left, separator_right FROM templates
+                        WHERE template IS NOT NULL ORDER BY rowid''')
+        conn.execute('DROP TABLE templates')
+    conn.execute('ALTER TABLE templates_new RENAME TO templates')
+
+
+def _migration_compiled_templates(conn):
+    # Скомпилированные шаблоны: заголовок (хэш содержимого, размер и время изменения файла, сепараторы) и строки
+    # шаблона - параграфы (table_index IS NULL) и ячейки таблиц
+    conn.execute('''CREATE TABLE compiled_templates (template TEXT PRIMARY KEY, content_hash TEXT, mtime_ns INTEGER,
+                    size INTEGER, separator_left TEXT, separator_right TEXT, compiler_version INTEGER)''')
+    conn.execute('''CREATE TABLE compiled_lines (template TEXT, line_index INTEGER, table_index INTEGER,
+                    coordinates TEXT, text TEXT, fragments TEXT, tags TEXT, static TEXT,
+                    PRIMARY KEY (template, line_index))''')
+
+
+def _migration_result_cache(conn):
+    # База кэша результатов (CACHE_PATH): ключ - хэш документа, хэш скомпилированного шаблона и версия извлечения;
+    # accessed - время последнего обращения для вытеснения давно не использованных записей
+    conn.execute('''CREATE TABLE result_cache (document_hash TEXT, template_hash TEXT, extractor_version INTEGER,
+                    data TEXT, size INTEGER, accessed REAL,
+                    PRIMARY KEY (document_hash, template_hash, extractor_version))''')
+    conn.execute('CREATE INDEX result_cache_accessed ON result_cache (accessed)')
+
+
+def _migration_watch(conn):
+    # Режим наблюдения: папки с назначенным шаблоном и манифест уже обработанных в них файлов
+    conn.execute('CREATE TABLE watch_directories (directory TEXT PRIMARY KEY, template TEXT)')
+    conn.execute('''CREATE TABLE watch_manifest (path TEXT PRIMARY KEY, directory TEXT, mtime_ns INTEGER, size INTEGER,
+                    content_hash TEXT, template TEXT, processed REAL)''')
+    conn.execute('CREATE INDEX watch_manifest_directory ON watch_manifest (directory)')
+
+
+# Миграции схемы базы настроек по порядку; номер последней примененной хранится в PRAGMA user_version
+migrations = [
+    _migration_templates_primary_key,
+    _migration_compiled_templates,
+    _migration_watch,
+]
+
+# Миграции схемы базы кэша результатов
+cache_migrations = [
+    _migration_result_cache,
+]
+
+
+def migrate(conn, migrations=migrations):
+    """
+    Функция применяет к базе миграции схемы, которые еще не применены
+    :param conn: соединение с базой
+    :param migrations: список миграций базы (migrations - база настроек, cache_migrations - кэш результатов)
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for number, migration in enumerate(migrations[version:], start=version + 1):
+        conn.execute('BEGIN')
+        try:
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+
+
+def get_connection(path=DB_PATH, migrations=migrations):
+    """
+    Функция возвращает долгоживущее соединение с базой для текущего потока, при первом обращении открывая
+    его в режиме WAL и применяя миграции схемы
+    :param path: путь к базе
+    :param migrations: миграции схемы базы (см. migrate)
+
+    :return: объект sqlite3.Connection
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None or _local.pid != os.getpid():
+        connections = _local.connections = {}
+        _local.pid = os.getpid()
+
+    key = os.path.abspath(path)
+    conn = connections.get(key)
+    if conn is None:
+        conn = sqlite3.connect(path)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        migrate(conn, migrations=migrations)
+        connections[key] = conn
+    return conn
+
+
+@measured('db_read')
+def get_template_settings(template, path=DB_PATH):
+    """
+    Функция возвращает настройки шаблона
+    :param template: путь к файлу-шаблону относительно папки проекта (например, "templates/Образец shablon.docx")
+    :param path: путь к базе настроек
+
+    :return: кортеж (template, separator_left, separator_right) или None, если шаблон не зарегистрирован
+    """
+    return get_connection(path).execute('''SELECT template, separator_left, separator_right FROM templates
+                                           WHERE template = ?''', (template.replace('\\', '/'),)).fetchone()
+
+
+@measured('db_read')
+def get_templates(path=DB_PATH):
+    """
+    Функция возвращает настройки всех зарегистрированных шаблонов
+
+    :return: список кортежей (template, separator_left, separator_right)
+    """
+    return get_connection(path).execute('''SELECT template, separator_left, separator_right FROM templates
+                                           ORDER BY template''').fetchall()
+
+
+@measured('db_write')
+def save_template_settings(template, separator_left, separator_right, path=DB_PATH):
+    """
+    Функция сохраняет настройки шаблона, заменяя прежние
+    :param template: путь к файлу-шаблону относительно папки проекта
+    :param separator_left: сепаратор слева от метки
+    :param separator_right: сепаратор справа от метки
+    :param path: путь к базе настроек
+    """
+    conn = get_connection(path)
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO templates (template, separator_left, separator_right) VALUES (?, ?, ?)',
+                     (template.replace('\\', '/'), separator_left, separator_right))
+
+
+@measured('db_read')
+def load_compiled_template(template, path=DB_PATH):
+    """
+    Функция возвращает сохраненный скомпилированный шаблон
+    :param template: путь к файлу-шаблону
+    :param path: путь к базе настроек
+
+    :return: кортеж (заголовок (content_hash, mtime_ns, size, separator_left, separator_right, compiler_version),
+    список строк (table_index, coordinates, text, fragments, tags, static) по порядку) или None
+    """
+    conn = get_connection(path)
+    template = template.replace('\\', '/')
+    header = conn.execute('''SELECT content_hash, mtime_ns, size, separator_left, separator_right, compiler_version
+                             FROM compiled_templates WHERE template = ?''', (template,)).fetchone()
+    if header is None:
+        return None
+    lines = conn.execute('''SELECT table_index, coordinates, text, fragments, tags, static FROM compiled_lines
+                            WHERE template = ? ORDER BY line_index''', (template,)).fetchall()
+    return header, lines
+
+
+@measured('db_write')
+def save_compiled_template(template, header, lines, path=DB_PATH):
+    """
+    Функция сохраняет скомпилированный шаблон, заменяя прежний
+    :param template: путь к файлу-шаблону
+    :param header: кортеж (content_hash, mtime_ns, size, separator_left, separator_right, compiler_version)
+    :param lines: список строк (table_index, coordinates, text, fragments, tags, static)
+    :param path: путь к базе настроек
+    """
+    conn = get_connection(path)
+    template = template.replace('\\', '/')
+    with conn:
+        conn.execute('DELETE FROM compiled_lines WHERE template = ?', (template,))
+        conn.execute('''INSERT OR REPLACE INTO compiled_templates (template, content_hash, mtime_ns, size,
+                        separator_left, separator_right, compiler_version) VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                     (template,) + tuple(header))
+        conn.executemany('''INSERT INTO compiled_lines (template, line_index, table_index, coordinates, text,
+                            fragments, tags, static) VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                         [(template, index) + tuple(line) for index, line in enumerate(lines)])
+
+
+@measured('db_write')
+def update_compiled_template_stat(template, mtime_ns, size, path=DB_PATH):
+    """
+    Функция обновляет время изменения и размер файла сохраненного шаблона (когда файл изменен, но содержимое то же)
+    """
+    conn = get_connection(path)
+    with conn:
+        conn.execute('UPDATE compiled_templates SET mtime_ns = ?, size = ? WHERE template = ?',
+                     (mtime_ns, size, template.replace('\\', '/')))
+
+
+@measured('db_read')
+def load_cached_result(document_hash, template_hash, extractor_version, path=CACHE_PATH):
+    """
+    Функция возвращает сохраненный результат извлечения и отмечает время обращения к нему
+    :param document_hash: SHA-256 документа
+    :param template_hash: хэш скомпилированного шаблона
+    :param extractor_version: версия извлечения данных
+    :param path: путь к базе кэша результатов
+
+    :return: JSON-строка с данными или None, если результата нет
+    """
+    conn = get_connection(path, migrations=cache_migrations)
+    key = (document_hash, template_hash, extractor_version)
+    row = conn.execute('''SELECT data FROM result_cache
+                          WHERE document_hash = ? AND template_hash = ? AND extractor_version = ?''', key).fetchone()
+    if row is None:
+        return None
+    with conn:
+        conn.execute('''UPDATE result_cache SET accessed = ?
+                        WHERE document_hash = ? AND template_hash = ? AND extractor_version = ?''',
+                     (time.time(),) + key)
+    return row[0]
+
+
+@measured('db_write')
+def save_cached_result(document_hash, template_hash, extractor_version, data, path=CACHE_PATH):
+    """
+    Функция сохраняет результат извлечения, заменяя прежний
+    :param document_hash: SHA-256 документа
+    :param template_hash: хэш скомпилированного шаблона
+    :param extractor_version: версия извлечения данных
+    :param data: JSON-строка с данными
+    :param path: путь к базе кэша результатов
+
+    :return: размер сохраненных данных в байтах
+    """
+    size = len(data.encode('utf-8'))
+    conn = get_connection(path, migrations=cache_migrations)
+    with conn:
+        conn.execute('''INSERT OR REPLACE INTO result_cache (document_hash, template_hash, extractor_version, data,
+                        size, accessed) VALUES (?, ?, ?, ?, ?, ?)''',
+                     (document_hash, template_hash, extractor_version, data, size, time.time()))
+    return size
+
+
+@measured('db_read')
+def get_result_cache_size(path=CACHE_PATH):
+    """
+    Функция возвращает количество записей кэша результатов и их суммарный размер в байтах
+    """
+    conn = get_connection(path, migrations=cache_migrations)
+    entries, size = conn.execute('SELECT COUNT(*), SUM(size) FROM result_cache').fetchone()
+    return entries, size or 0
+
+
+@measured('db_write')
+def evict_cached_results(max_bytes, path=CACHE_PATH):
+    """
+    Функция удаляет из кэша результатов записи, к которым дольше всего не обращались, пока суммарный размер
+    оставшихся больше max_bytes
+    :param max_bytes: допустимый размер кэша в байтах
+    :param path: путь к базе кэша результатов
+
+    :return: количество удаленных записей
+    """
+    conn = get_connection(path, migrations=cache_migrations)
+    with conn:
+        return conn.execute('''DELETE FROM result_cache WHERE rowid IN (
+                                   SELECT rowid FROM (SELECT rowid, SUM(size) OVER (ORDER BY accessed DESC, rowid DESC)
+                                                      AS total FROM result_cache)
+                                   WHERE total > ?)''', (max_bytes,)).rowcount
+
+
+@measured('db_read')
+def get_watch_directories(path=DB_PATH):
+    """
+    Функция возвращает папки, за которыми ведется наблюдение
+
+    :return: список кортежей (папка, путь к файлу-шаблону)
+    """
+    return get_connection(path).execute('SELECT directory, template FROM watch_directories ORDER BY directory').fetchall()
+
+
+@measured('db_write')
+def save_watch_directory(directory, template, path=DB_PATH):
+    """
+    Функция назначает папке шаблон, заменяя прежний
+    :param directory: путь к папке
+    :param template: путь к файлу-шаблону
+    :param path: путь к базе настроек
+    """
+    conn = get_connection(path)
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO watch_directories (directory, template) VALUES (?, ?)',
+                     (directory.replace('\\', '/'), template.replace('\\', '/')))
+
+
+@measured('db_write')
+def delete_watch_directory(directory, path=DB_PATH):
+    """
+    Функция прекращает наблюдение за папкой и удаляет манифест ее файлов
+    """
+    conn = get_connection(path)
+    directory = directory.replace('\\', '/')
+    with conn:
+        conn.execute('DELETE FROM watch_directories WHERE directory = ?', (directory,))
+        conn.execute('DELETE FROM watch_manifest WHERE directory = ?', (directory,))
+
+
+@measured('db_read')
+def load_watch_manifest(directory, path=DB_PATH):
+    """
+    Функция возвращает манифест обработанных файлов папки
+    :param directory: путь к папке
+    :param path: путь к базе настроек
+
+    :return: словарь {путь к файлу: (mtime_ns, size, content_hash, template)}
+    """
+    rows = get_connection(path).execute('''SELECT path, mtime_ns, size, content_hash, template FROM watch_manifest
+                                          WHERE directory = ?''', (directory.replace('\\', '/'),))
+    return {row[0]: row[1:] for row in rows}
+
+
+@measured('db_write')
+def save_watch_manifest(directory, entries, removed=(), path=DB_PATH):
+    """
+    Функция записывает в манифест папки обработанные файлы и удаляет из него исчезнувшие
+    :param directory: путь к папке
+    :param entries: список кортежей (путь к файлу, mtime_ns, size, content_hash, template)
+    :param removed: пути к файлам, которых больше нет в папке
+    :param path: путь к базе настроек
+    """
+    conn = get_connection(path)
+    directory = directory.replace('\\', '/')
+    now = time.time()
+    with conn:
+        conn.executemany('''INSERT OR REPLACE INTO watch_manifest (path, directory, mtime_ns, size, content_hash, template,
+                            processed) VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                         [(entry[0], directory) + tuple(entry[1:]) + (now,) for entry in entries])
+        conn.executemany('DELETE FROM watch_manifest WHERE path = ?', [(file,) for file in removed])
@@ -0,0 +1,232 @@
+import io
+import posixpath
+import zipfile
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+OFFICE_DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+
+PARAGRAPH = 'paragraph'
+TABLE = 'table'
+CELL = 'cell'
+
+# Типы документов в памяти, которые принимают функции чтения наравне с путем к файлу (см. open_source)
+BUFFER_TYPES = (bytes, bytearray, memoryview)
+
+
+def open_source(source):
+    """
+    Функция приводит документ к виду, который принимает zipfile.ZipFile
+    :param source: путь к файлу, содержимое файла (bytes, bytearray, memoryview) или файлоподобный объект с
+    поддержкой seek, открытый в двоичном режиме
+
+    :return: путь к файлу или файлоподобный объект. Содержимое в bytes оборачивается в io.BytesIO без копирования
+    (BytesIO использует неизменяемый буфер bytes, пока в него не пишут), содержимое в bytearray и memoryview
+    io.BytesIO копирует
+    """
+    if isinstance(source, BUFFER_TYPES):
+        return io.BytesIO(source)
+    return source
+
+
+def main_part_name(archive):
+    """
+    Функция возвращает имя основной части документа внутри архива .docx (как правило, word/document.xml)
+    """
+    from lxml import etree
+
+    try:
+        rels = etree.fromstring(archive.read('_rels/.rels'))
+    except KeyError:
+        return 'word/document.xml'
+    for rel in rels:
+        if rel.get('Type') == OFFICE_DOCUMENT:
+            return posixpath.normpath(rel.get('Target').lstrip('/'))
+    return 'word/document.xml'
+
+
+def _run_text(run):
+    # Те же правила, что у python-docx (Run.text): разрывы строки и табуляции переводятся в символы
+    text = []
+    for element in run:
+        tag = element.tag
+        if tag == W + 't':
+            text.append(element.text or '')
+        elif tag == W + 'tab' or tag == W + 'ptab':
+            text.append('\t')
+        elif tag == W + 'br':
+            if element.get(W + 'type', 'textWrapping') == 'textWrapping':
+                text.append('\n')
+        elif tag == W + 'cr':
+            text.append('\n')
+        elif tag == W + 'noBreakHyphen':
+            text.append('-')
+    return ''.join(text)
+
+
+def _paragraph_text(paragraph):
+    text = []
+    for element in paragraph:
+        if element.tag == W + 'r':
+            text.append(_run_text(element))
+        elif element.tag == W + 'hyperlink':
+            for run in element:
+                if run.tag == W + 'r':
+                    text.append(_run_text(run))
+    return ''.join(text)
+
+
+def _cell_text(tc):
+    return '\n'.join(_paragraph_text(p) for p in tc if p.tag == W + 'p')
+
+
+def _properties_value(element, properties, name, default=None):
+    properties = element.find(W + properties)
+    if properties is None:
+        return default
+    value = properties.find(W + name)
+    if value is None:
+        return default
+    return value.get(W + 'val', '')
+
+
+def _row_cells(tr):
+    """
+    Функция возвращает логические ячейки строки таблицы, каждую один раз: ячейка, объединенная по горизонтали
+    (gridSpan), занимает несколько столбцов сетки, но возвращается один раз со своим первым столбцом, а продолжение
+    объединения по вертикали (vMerge) пропускается - ячейка уже возвращена в строке, где объединение начинается
+    :param tr: элемент w:tr
+
+    :return: список кортежей (номер столбца сетки, начиная с 1; текст ячейки)
+    """
+    cells = []
+    grid_offset = int(_properties_value(tr, 'trPr', 'gridBefore', 0) or 0)
+    for tc in tr:
+        if tc.tag != W + 'tc':
+            continue
+        span = int(_properties_value(tc, 'tcPr', 'gridSpan', 1) or 1)
+        if _properties_value(tc, 'tcPr', 'vMerge') not in ('', 'continue'):
+            cells.append((grid_offset + 1, _cell_text(tc)))
+        grid_offset += span
+    return cells
+
+
+def _release(element):
+    # Освобождаем память: обработанный элемент и все предшествующие ему соседние элементы больше не нужны
+    element.clear()
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def iter_document(file_path):
+    """
+    Функция потоково читает word/document.xml прямо из архива .docx, не строя дерево документа целиком: каждый
+    параграф и каждая строка таблицы освобождаются сразу после обработки, поэтому потребление памяти не зависит
+    от объема документа. Учитываются параграфы и таблицы верхнего уровня (как document.paragraphs и document.tables
+    в python-docx)
+    :param file_path: путь к файлу Word, его содержимое или файлоподобный объект (см. open_source)
+
+    :return: генератор кортежей (PARAGRAPH, текст параграфа), (TABLE, номер таблицы) в начале каждой таблицы и
+    (CELL, номер таблицы, номер строки, номер столбца сетки, текст ячейки) для каждой логической ячейки один раз
+    (см. _row_cells); нумерация начинается с 1
+    """
+    with zipfile.ZipFile(open_source(file_path)) as archive:
+        with archive.open(main_part_name(archive)) as stream:
+            yield from iter_document_part(stream)
+
+
+def iter_document_part(stream):
+    """
+    Функция потоково разбирает основную часть документа (word/document.xml), уже извлеченную из архива (см.
+    iter_document)
+    :param stream: файлоподобный объект с XML основной части
+
+    :return: генератор кортежей, как у iter_document
+    """
+    # lxml импортируется при первом чтении документа, а не при запуске программы
+    from lxml import etree
+
+    # Стек открытых таблиц: True - таблица верхнего уровня, False - вложенная или внутри w:sdt
+    tables = []
+    table_index = 0
+    row_index = 0
+
+    for event, element in etree.iterparse(stream, events=('start', 'end'),
+                                          tag=(W + 'p', W + 'tbl', W + 'tr')):
+        tag = element.tag
+        if event == 'start':
+            if tag == W + 'tbl':
+                top_level = not tables and element.getparent().tag == W + 'body'
+                tables.append(top_level)
+                if top_level:
+                    table_index += 1
+                    row_index = 0
+                    yield TABLE, table_index
+            continue
+
+        if tag == W + 'p':
+            if not tables and element.getparent().tag == W + 'body':
+                yield PARAGRAPH, _paragraph_text(element)
+                _release(element)
+        elif tag == W + 'tr':
+            if tables == [True] and element.getparent().tag == W + 'tbl':
+                row_index += 1
+                for cell_index, text in _row_cells(element):
+                    yield CELL, table_index, row_index, cell_index, text
+                _release(element)
+        else:
+            if tables.pop() or not tables:
+                _release(element)
+
+
+def read_docx(file_path):
+    """
+    Функция открывает файл Word один раз и возвращает и параграфы, и содержимое ячеек таблиц
+    :param file_path: путь к анализируемому файлу, его содержимое или файлоподобный объект (см. open_source)
+
+    :return: кортеж (список параграфов, как в read_paragraphs; словарь таблиц, как в extract_tables_from_docx)
+    """
+    return collect_document(iter_document(file_path))
+
+
+def collect_document(items):
+    """
+    Функция собирает параграфы и ячейки таблиц из потока iter_document или iter_document_part
+    :param items: генератор кортежей (см. iter_document)
+
+    :return: кортеж (список параграфов, словарь таблиц), как у read_docx
+    """
+    paragraphs = []
+    tables_data = {}
+    for item in items:
+        if item[0] == PARAGRAPH:
+            paragraphs.append(item[1])
+        elif item[0] == TABLE:
+            tables_data[item[1]] = {}
+        else:
+            _, table_index, row_index, cell_index, text = item
+            tables_data[table_index][f'{row_index}*{cell_index}'] = text
+    return paragraphs, tables_data
+
+
+def read_paragraphs(doc_path):
+    """
+    Функция возвращает список параграфов текста (note: игнорирует таблицы)
+    :param doc_path: путь к анализиуемому файлу, его содержимое или файлоподобный объект (см. open_source)
+
+    :return: список строк, где каждая строка - один параграф
+    """
+    return read_docx(file_path=doc_path)[0]
+
+
+def extract_tables_from_docx(file_path):
+    """
+    Функция извлекает содержимое ячеек всех таблиц файла Word
+    :param file_path: путь к файлу, содержимое таблиц которого необходимо извлечь, его содержимое или файлоподобный
+    объект (см. open_source)
+
+    :return: словарь вида {'порядковый номер таблицы в документе': {'номер строки*номер столбца': содержимое ячейки}};
+    объединенная ячейка записывается один раз - по строке и первому столбцу сетки, с которых она начинается
+    """
+    return read_docx(file_path=file_path)[1]
@@ -0,0 +1,651 @@
+import bisect
+import functools
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from collections import Counter, OrderedDict
+from docx_reader import BUFFER_TYPES, read_docx
+from metrics import metrics
+from database import (DB_PATH, get_template_settings, load_compiled_template, save_compiled_template,
+                      update_compiled_template_stat)
+
+# Версия формата скомпилированных шаблонов: при изменении CompiledLine увеличивается, чтобы шаблоны, сохраненные
+# в базе настроек прежней версией, были скомпилированы заново
+COMPILER_VERSION = 3
+
+# Версия извлечения данных (extract_data): увеличивается при любом изменении результата извлечения, чтобы кэш
+# результатов (см. result_cache.py) не возвращал данные, полученные прежней версией
+EXTRACTOR_VERSION = 6
+
+
+class CompiledLine:
+    """
+    Строка шаблона, разобранная один раз на статичные части и метки. Извлечение данных - один проход по строке
+    документа слева направо: статичные части ищутся по порядку, каждая - начиная с конца предыдущей, а значения меток
+    вырезаются между ними. Возврата, как у регулярного выражения с ленивыми группами, нет, поэтому и строка, которая
+    не соответствует шаблону, проверяется за линейное время
+    """
+    __slots__ = ('template', 'fragments', 'tags', 'static')
+
+    def __init__(self, template: str, separator_left: str, separator_right: str):
+        """
+        :param template: размеченная строка-шаблон
+        :param separator_left: сепаратор слева от метки
+        :param separator_right: сепаратор справа от метки
+        """
+        tag_pattern = re.compile(rf'{re.escape(separator_left)}(.*?){re.escape(separator_right)}')
+        parts = tag_pattern.split(template)
+
+        self.template = template
+        self.fragments = [i for i in parts[0::2] if i != '']
+        self.tags = parts[1::2]
+        # Статичные части по порядку, включая пустые: перед первой меткой, между метками и после последней
+        self.static = parts[0::2]
+
+    @classmethod
+    def restore(cls, template: str, fragments: list, tags: list, static: list):
+        """
+        Функция восстанавливает строку шаблона из сохраненных частей без повторного разбора (см. store_compiled_template)
+        :param template: размеченная строка-шаблон
+        :param fragments: статичные фрагменты
+        :param tags: имена меток
+        :param static: статичные части по порядку, включая пустые
+
+        :return: объект CompiledLine
+        """
+        line = cls.__new__(cls)
+        line.template = template
+        line.fragments = fragments
+        line.tags = tags
+        line.static = static
+        return line
+
+    def match(self, string: str):
+        """
+        Функция извлекает данные из строки документа по скомпилированной строке-шаблону
+        :param string: анализируемая строка документа
+
+        :return: словарь вида {VARIABLE_NAME: VARIABLE_VALUE} (см. get_data_from_string); пустой словарь, если
+        строка не соответствует шаблону
+        """
+        static = self.static
+        if not self.tags:
+            return {}
+        # Первая статичная часть должна стоять в начале строки, последняя - в конце
+        end = len(string) - len(static[-1])
+        if not string.startswith(static[0]) or not string.endswith(static[-1]):
+            return {}
+
+        # Каждое значение непустое; очередная статичная часть берется в самом левом вхождении: оно оставляет
+        # последующим частям больше всего места, поэтому если строка соответствует шаблону, то и при таком выборе
+        # (так же выбирают ленивые группы .+?)
+        position = len(static[0])
+        values = []
+        for fragment in static[1:-1]:
+            if fragment == '':
+                start = position + 1
+            else:
+                start = string.find(fragment, position + 1, end)
+            if start == -1 or start > end:
+                return {}
+            values.append(string[position:start])
+            position = start + len(fragment)
+        if position >= end:
+            return {}
+        values.append(string[position:end])
+
+        dict = {}
+        for tag, value in zip(self.tags, values):
+            if tag != '':
+                dict[tag] = value
+        return dict
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_line(template: str, separator_left: str, separator_right: str):
+    """
+    Функция возвращает скомпилированную строку-шаблон, повторно используя ранее скомпилированные
+    :param template: размеченная строка-шаблон
+    :param separator_left: сепаратор слева от метки
+    :param separator_right: сепаратор справа от метки
+
+    :return: объект CompiledLine
+    """
+    return CompiledLine(template=template, separator_left=separator_left, separator_right=separator_right)
+
+
+def get_data_from_string(template: str, string: str, separator_left: str, separator_right: str):
+    """
+    Функция извлекает данные из шаблонной строки сопоставлением со скомпилированным шаблоном (см. CompiledLine):
+
+    :param template: размеченная строка-шаблон (например, "<SELLER>, выступающий от лица компании <COMPANY_NAME> на основании <ORDER_NUMBER>", где <SELLER>, <COMPANY_NAME> и <ORDER_NUMBER> стоят на месте изменяемых частей строки, а ", выступающий от лица компании " и " на основании " - статичные части строки)
+    :param string: анализируемая строка документа, из которой необходимо извлечь данные по шаблону. Например, "Иванов Иван Иванович, выступающий от лица компании 3D PlastPrint на основании приказа №IN027/SEL0523", где фрагменты "Иванов Иван Иванович", "3D PlastPrint" и "приказа №IN027/SEL0523" будут извлечены под именами переменных <SELLER>, <COMPANY_NAME> и <ORDER_NUMBER> соответственно.
+    :param separator_left: символ или сочетание символов, ограничивающее метку переменной слева. В приведенном выше примере это "<"
+    :param separator_right: символ или сочетание символов, ограничивающее метку переменной справа. В приведенном выше примере это ">"
+
+    :return: словарь вида {VARIABLE_NAME: VARIABLE_VALUE}, где VARIABLE_NAME - имя переменной, полученное из размеченного шаблона, VARIABLE_VALUE - значение данной переменной, полученное из анализируемой строки. В случае приведенного выше примера будет возвращен словарь {"SELLER": "Иванов Иван Иванович", "COMPANY_NAME": "3D PlastPrint", "ORDER_NUMBER": "приказа №IN027/SEL0523"}
+    """
+    return compile_line(template=template, separator_left=separator_left,
+                        separator_right=separator_right).match(string)
+
+
+class CompiledTemplate:
+    """
+    Файл-шаблон, прочитанный и разобранный один раз: параграфы и ячейки таблиц в виде CompiledLine
+    """
+
+    def __init__(self, path: str, separator_left: str, separator_right: str):
+        """
+        :param path: путь к файлу-шаблону
+        :param separator_left: сепаратор слева от метки
+        :param separator_right: сепаратор справа от метки
+        """
+        self.path = path
+        self.separator_left = separator_left
+        self.separator_right = separator_right
+        self.content_hash = file_hash(path)
+
+        paragraphs, tables_data = read_docx(file_path=path)
+
+        self.paragraphs = [CompiledLine(template=i, separator_left=separator_left, separator_right=separator_right)
+                           for i in paragraphs]
+
+        self.tables = {}
+        for table_index, table_data in tables_data.items():
+            self.tables[table_index] = {coordinates: CompiledLine(template=text, separator_left=separator_left,
+                                                                  separator_right=separator_right)
+                                        for coordinates, text in table_data.items()}
+
+        self._build_index()
+
+    @classmethod
+    def restore(cls, path: str, separator_left: str, separator_right: str, content_hash: str, paragraphs: list,
+                tables: dict):
+        """
+        Функция восстанавливает скомпилированный шаблон из сохраненных строк без чтения файла-шаблона
+        :param path: путь к файлу-шаблону
+        :param separator_left: сепаратор слева от метки
+        :param separator_right: сепаратор справа от метки
+        :param content_hash: SHA-256 содержимого файла-шаблона
+        :param paragraphs: список CompiledLine параграфов
+        :param tables: словарь {номер таблицы: {'номер строки*номер столбца': CompiledLine}}
+
+        :return: объект CompiledTemplate
+        """
+        compiled = cls.__new__(cls)
+        compiled.path = path
+        compiled.separator_left = separator_left
+        compiled.separator_right = separator_right
+        compiled.content_hash = content_hash
+        compiled.paragraphs = paragraphs
+        compiled.tables = tables
+        compiled._build_index()
+        return compiled
+
+    def fingerprint(self):
+        """
+        Функция возвращает хэш скомпилированного шаблона: содержимое файла-шаблона, сепараторы и версия компилятора
+
+        :return: строка из 64 шестнадцатеричных символов
+        """
+        key = '\0'.join((self.content_hash, self.separator_left, self.separator_right, str(COMPILER_VERSION)))
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _build_index(self):
+        # Ячейки таблиц с метками по порядку (номер таблицы, 'номер строки*номер столбца', CompiledLine): ячейки
+        # без меток при извлечении не просматриваются
+        self.cells = [(table_index, coordinates, line) for table_index, table in self.tables.items()
+                      for coordinates, line in table.items() if line.tags]
+
+        # Имена меток без повторов: сначала из таблиц, затем из параграфов (порядок ключей результата extract_data)
+        lines = [line for table in self.tables.values() for line in table.values()] + self.paragraphs
+        self.tags = list(dict.fromkeys(tag for line in lines for tag in line.tags if tag != ''))
+
+
+def file_hash(path):
+    """
+    Функция возвращает SHA-256 содержимого файла
+    :param path: путь к файлу, содержимое файла (bytes, bytearray, memoryview) или файлоподобный объект с поддержкой
+    seek: он читается с начала, а затем возвращается на прежнюю позицию
+
+    :return: строка из 64 шестнадцатеричных символов
+    """
+    if isinstance(path, BUFFER_TYPES):
+        return hashlib.sha256(path).hexdigest()
+
+    sha256 = hashlib.sha256()
+    if hasattr(path, 'read'):
+        position = path.tell()
+        path.seek(0)
+        for chunk in iter(lambda: path.read(1024 * 1024), b''):
+            sha256.update(chunk)
+        path.seek(position)
+        return sha256.hexdigest()
+
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def store_compiled_template(compiled_template: CompiledTemplate, stat, db_path=DB_PATH):
+    """
+    Функция сохраняет скомпилированный шаблон в базу настроек
+    :param compiled_template: скомпилированный шаблон
+    :param stat: результат os.stat файла-шаблона
+    :param db_path: путь к базе настроек
+    """
+    lines = []
+    for line in compiled_template.paragraphs:
+        lines.append((None, None, line.template, json.dumps(line.fragments, ensure_ascii=False),
+                      json.dumps(line.tags, ensure_ascii=False), json.dumps(line.static, ensure_ascii=False)))
+    for table_index, table in compiled_template.tables.items():
+        for coordinates, line in table.items():
+            lines.append((table_index, coordinates, line.template, json.dumps(line.fragments, ensure_ascii=False),
+                          json.dumps(line.tags, ensure_ascii=False), json.dumps(line.static, ensure_ascii=False)))
+
+    header = (compiled_template.content_hash, stat.st_mtime_ns, stat.st_size, compiled_template.separator_left,
+              compiled_template.separator_right, COMPILER_VERSION)
+    save_compiled_template(template=compiled_template.path, header=header, lines=lines, path=db_path)
+
+
+def load_stored_template(path: str, separator_left: str, separator_right: str, stat, db_path=DB_PATH):
+    """
+    Функция загружает скомпилированный шаблон из базы настроек, если он соответствует файлу-шаблону: совпадают
+    сепараторы и версия компилятора, а также время изменения и размер файла либо, если они изменились, хэш содержимого
+    :param path: путь к файлу-шаблону
+    :param separator_left: сепаратор слева от метки
+    :param separator_right: сепаратор справа от метки
+    :param stat: результат os.stat файла-шаблона
+    :param db_path: путь к базе настроек
+
+    :return: объект CompiledTemplate или None, если шаблон нужно скомпилировать заново
+    """
+    stored = load_compiled_template(template=path, path=db_path)
+    if stored is None:
+        return None
+
+    (content_hash, mtime_ns, size, stored_left, stored_right, compiler_version), rows = stored
+    if (stored_left, stored_right, compiler_version) != (separator_left, separator_right, COMPILER_VERSION):
+        return None
+    if (mtime_ns, size) != (stat.st_mtime_ns, stat.st_size):
+        if file_hash(path) != content_hash:
+            return None
+        update_compiled_template_stat(template=path, mtime_ns=stat.st_mtime_ns, size=stat.st_size, path=db_path)
+
+    paragraphs = []
+    tables = {}
+    for table_index, coordinates, text, fragments, tags, static in rows:
+        line = CompiledLine.restore(template=text, fragments=json.loads(fragments), tags=json.loads(tags),
+                                    static=json.loads(static))
+        if table_index is None:
+            paragraphs.append(line)
+        else:
+            tables.setdefault(table_index, {})[coordinates] = line
+
+    return CompiledTemplate.restore(path=path, separator_left=separator_left, separator_right=separator_right,
+                                    content_hash=content_hash, paragraphs=paragraphs, tables=tables)
+
+
+class TemplateCache:
+    """
+    Кэш скомпилированных шаблонов в памяти процесса. Ключ - путь, время изменения и размер файла, а также
+    сепараторы, поэтому измененный на диске шаблон будет скомпилирован заново. При переполнении вытесняется
+    шаблон, к которому дольше всего не обращались. Промах кэша сначала ищет шаблон в базе настроек
+    (см. load_stored_template) и только затем читает файл-шаблон
+    """
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self._templates = OrderedDict()
+
+    def get(self, path: str, separator_left: str, separator_right: str, db_path=DB_PATH):
+        """
+        Функция возвращает скомпилированный шаблон, компилируя его только при первом обращении или после изменения файла
+        :param path: путь к файлу-шаблону
+        :param separator_left: сепаратор слева от метки
+        :param separator_right: сепаратор справа от метки
+        :param db_path: путь к базе настроек с сохраненными шаблонами; None - не использовать базу
+
+        :return: объект CompiledTemplate
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, separator_left, separator_right)
+
+        compiled = self._templates.get(key)
+        if compiled is not None:
+            self._templates.move_to_end(key)
+            return compiled
+
+        compiled = None
+        if db_path is not None:
+            try:
+                compiled = load_stored_template(path=path, separator_left=separator_left,
+                                                separator_right=separator_right, stat=stat, db_path=db_path)
+            except sqlite3.Error as e:
+                print('Не удалось загрузить шаблон из базы данных:', e)
+
+        if compiled is None:
+            with metrics.timer('compile'):
+                compiled = CompiledTemplate(path=path, separator_left=separator_left, separator_right=separator_right)
+            if db_path is not None:
+                try:
+                    store_compiled_template(compiled_template=compiled, stat=stat, db_path=db_path)
+                except sqlite3.Error as e:
+                    print('Не удалось сохранить шаблон в базу данных:', e)
+
+        self._templates[key] = compiled
+        while len(self._templates) > self.maxsize:
+            self._templates.popitem(last=False)
+        return compiled
+
+    def clear(self):
+        self._templates.clear()
+
+
+template_cache = TemplateCache()
+
+
+def get_compiled_template(path: str, separator_left: str, separator_right: str, db_path=DB_PATH):
+    """
+    Функция возвращает скомпилированный шаблон из кэша процесса или из базы настроек
+    :param path: путь к файлу-шаблону
+    :param separator_left: сепаратор слева от метки
+    :param separator_right: сепаратор справа от метки
+    :param db_path: путь к базе настроек; None - не использовать базу
+
+    :return: объект CompiledTemplate
+    """
+    return template_cache.get(path=path, separator_left=separator_left, separator_right=separator_right,
+                              db_path=db_path)
+
+
+def load_template(path: str, separator_left=None, separator_right=None, db_path=DB_PATH):
+    """
+    Функция возвращает скомпилированный шаблон с заданными сепараторами, а если они не заданы - с сепараторами
+    из базы настроек (для незарегистрированного шаблона - "<" и ">")
+    :param path: путь к файлу-шаблону
+    :param separator_left: сепаратор слева от метки или None
+    :param separator_right: сепаратор справа от метки или None
+    :param db_path: путь к базе настроек; если файла базы нет, шаблон компилируется из файла без базы
+
+    :return: объект CompiledTemplate
+    """
+    if db_path is not None and not os.path.exists(db_path):
+        db_path = None
+    templates_hits = get_template_settings(template=path, path=db_path) if db_path is not None else None
+    separator_left = separator_left or (templates_hits[1] if templates_hits else '<')
+    separator_right = separator_right or (templates_hits[2] if templates_hits else '>')
+    return get_compiled_template(path=path, separator_left=separator_left, separator_right=separator_right,
+                                 db_path=db_path)
+
+
+# Ширина полосы выравнивания участка (см. _align_gap): сколько параграфов сверх разницы длин участка может быть
+# вставлено и удалено одновременно. Участок, который целиком помещается в полосу, выравнивается полностью
+ALIGN_BAND = 32
+
+# Наибольшее число клеток полосы, при котором участок выравнивается целиком; больший участок сначала делится опорными
+# точками (см. _anchors), а участок, который и после этого больше (например, в документе нет уникальных статичных
+# строк), сопоставляется жадно (см. _align_greedy), чтобы время выравнивания очень длинного документа с правками по
+# всему тексту оставалось близким к линейному
+ALIGN_MAX_CELLS = 50000
+
+
+def _match_rank(line: CompiledLine, paragraph: str):
+    # Ранг пары: 2 - строка с метками и параграф, из которого извлекаются данные; 1 - непустая строка без меток и
+    # такой же параграф; 0 - такая же пустая строка; None - параграф строке не соответствует
+    if line.tags:
+        return 2 if line.match(paragraph) != {} else None
+    if line.template != paragraph:
+        return None
+    return 1 if paragraph != '' else 0
+
+
+def _align_gap(template_paragraphs, file_paragraphs, template_start, template_end, file_start, file_end, split=False):
+    # Участок выравнивается динамическим программированием (наибольшая общая подпоследовательность с весами): пары
+    # строк с метками важнее любого количества пар строк без меток, а те - любого количества пар пустых строк, поэтому
+    # пустой или статичный параграф не может занять пару строки с метками. Совпадающие по порядку начало и конец участка
+    # сопоставляются сразу, а оставшаяся середина - в полосе вокруг диагонали шириной в разницу длин плюс ALIGN_BAND.
+    # При split середина больше ALIGN_MAX_CELLS выравнивается по участкам между опорными точками, а без опорных точек
+    # или без split - жадно
+    head = []
+    while template_start < template_end and file_start < file_end and _match_rank(
+            line=template_paragraphs[template_start], paragraph=file_paragraphs[file_start]) is not None:
+        head.append((template_start, file_start))
+        template_start, file_start = template_start + 1, file_start + 1
+    tail = []
+    while template_start < template_end and file_start < file_end and _match_rank(
+            line=template_paragraphs[template_end - 1], paragraph=file_paragraphs[file_end - 1]) is not None:
+        template_end, file_end = template_end - 1, file_end - 1
+        tail.append((template_end, file_end))
+
+    n, m = template_end - template_start, file_end - file_start
+    if n == 0 or m == 0:
+        middle = [(template_start + i, None) for i in range(n)] + [(None, file_start + j) for j in range(m)]
+        return head + middle + tail[::-1]
+
+    low, high = min(0, m - n) - ALIGN_BAND, max(0, m - n) + ALIGN_BAND
+    if n * (high - low + 1) > ALIGN_MAX_CELLS:
+        anchors = _anchors(template_paragraphs=template_paragraphs[template_start:template_end],
+                           file_paragraphs=file_paragraphs[file_start:file_end]) if split else []
+        if not anchors:
+            return head + _align_greedy(template_paragraphs=template_paragraphs, file_paragraphs=file_paragraphs,
+                                        template_start=template_start, template_end=template_end,
+                                        file_start=file_start, file_end=file_end) + tail[::-1]
+        middle = []
+        i, j = template_start, file_start
+        for template_index, file_index in anchors + [(n, m)]:
+            template_index, file_index = template_start + template_index, file_start + file_index
+            middle.extend(_align_gap(template_paragraphs=template_paragraphs, file_paragraphs=file_paragraphs,
+                                     template_start=i, template_end=template_index, file_start=j,
+                                     file_end=file_index))
+            if template_index < template_end:
+                middle.append((template_index, file_index))
+            i, j = template_index + 1, file_index + 1
+        return head + middle + tail[::-1]
+
+    # Веса рангов 0, 1, 2: вес ранга больше суммы весов всех возможных пар младших рангов
+    weights = (1, n + 1, (n + 1) ** 2)
+
+    # scores[i] - лучшие веса выравнивания первых i строк участка с первыми j параграфами для j от starts[i]
+    starts = [0]
+    scores = [[0] * (min(m, high) + 1)]
+    for i in range(1, n + 1):
+        line = template_paragraphs[template_start + i - 1]
+        start, end = max(0, i + low), min(m, i + high)
+        previous, previous_start = scores[i - 1], starts[i - 1]
+        previous_end = previous_start + len(previous) - 1
+        row = []
+        for j in range(start, end + 1):
+            # Строка шаблона удалена
+            best = previous[j - previous_start] if previous_start <= j <= previous_end else -1
+            # Параграф документа вставлен
+            if j > start and row[-1] > best:
+                best = row[-1]
+            # Пара
+            if j > 0 and previous_start <= j - 1 <= previous_end:
+                rank = _match_rank(line=line, paragraph=file_paragraphs[file_start + j - 1])
+                if rank is not None and previous[j - 1 - previous_start] + weights[rank] > best:
+                    best = previous[j - 1 - previous_start] + weights[rank]
+            row.append(best)
+        starts.append(start)
+        scores.append(row)
+
+    # Обратный проход: пары, а между ними - удаленные строки шаблона и вставленные параграфы документа
+    matches = []
+    i, j = n, m
+    while i > 0 and j > 0:
+        score = scores[i][j - starts[i]]
+        previous, previous_start = scores[i - 1], starts[i - 1]
+        if previous_start <= j - 1 < previous_start + len(previous):
+            rank = _match_rank(line=template_paragraphs[template_start + i - 1],
+                               paragraph=file_paragraphs[file_start + j - 1])
+            if rank is not None and previous[j - 1 - previous_start] + weights[rank] == score:
+                matches.append((i - 1, j - 1))
+                i, j = i - 1, j - 1
+                continue
+        if previous_start <= j < previous_start + len(previous) and previous[j - previous_start] == score:
+            i -= 1
+        else:
+            j -= 1
+    matches.reverse()
+
+    # Несопоставленные строки шаблона и параграфы документа между соседними парами ставятся друг против друга по
+    # порядку (замена), остаток считается удаленным или вставленным
+    middle = []
+    i = j = 0
+    for template_index, file_index in matches + [(n, m)]:
+        replaced = min(template_index - i, file_index - j)
+        middle.extend((template_start + i + k, file_start + j + k) for k in range(replaced))
+        middle.extend((template_start + k, None) for k in range(i + replaced, template_index))
+        middle.extend((None, file_start + k) for k in range(j + replaced, file_index))
+        if template_index < n:
+            middle.append((template_start + template_index, file_start + file_index))
+        i, j = template_index + 1, file_index + 1
+    return head + middle + tail[::-1]
+
+
+def _align_greedy(template_paragraphs, file_paragraphs, template_start, template_end, file_start, file_end):
+    # Жадное сопоставление за линейное время для участка, слишком большого для динамического программирования: при
+    # несовпадении ищется продолжение не дальше ALIGN_BAND - параграф документа для текущей строки шаблона (параграфы
+    # до него вставлены) или строка шаблона для текущего параграфа (строки до нее удалены). Выбирается пара старшего
+    # ранга, а из них - ближайшая, поэтому пустая строка рядом не отнимает пару у строки с метками. Если продолжения
+    # нет, строка и параграф считаются заменой
+    pairs = []
+    i, j = template_start, file_start
+    while i < template_end and j < file_end:
+        if _match_rank(line=template_paragraphs[i], paragraph=file_paragraphs[j]) is not None:
+            pairs.append((i, j))
+            i, j = i + 1, j + 1
+            continue
+
+        skip = inserted = best_rank = None
+        for distance in range(1, ALIGN_BAND + 1):
+            if j + distance < file_end:
+                rank = _match_rank(line=template_paragraphs[i], paragraph=file_paragraphs[j + distance])
+                if rank is not None and (best_rank is None or rank > best_rank):
+                    skip, inserted, best_rank = distance, True, rank
+            if i + distance < template_end:
+                rank = _match_rank(line=template_paragraphs[i + distance], paragraph=file_paragraphs[j])
+                if rank is not None and (best_rank is None or rank > best_rank):
+                    skip, inserted, best_rank = distance, False, rank
+            if best_rank == 2:
+                break
+
+        if skip is None:
+            pairs.append((i, j))
+            i, j = i + 1, j + 1
+        elif inserted:
+            pairs.extend((None, j + k) for k in range(skip))
+            j += skip
+        else:
+            pairs.extend((i + k, None) for k in range(skip))
+            i += skip
+    pairs.extend((k, None) for k in range(i, template_end))
+    pairs.extend((None, k) for k in range(j, file_end))
+    return pairs
+
+
+def _anchors(template_paragraphs, file_paragraphs):
+    # Опорные пары - непустые параграфы шаблона без меток, которые встречаются ровно один раз и в шаблоне, и в документе
+    # (как в patience diff). Из них берется наибольшая подпоследовательность, возрастающая и по шаблону, и по документу
+    template_counts = Counter(line.template for line in template_paragraphs if not line.tags and line.template != '')
+    file_counts = Counter(file_paragraphs)
+    file_positions = {text: j for j, text in enumerate(file_paragraphs) if file_counts[text] == 1}
+    candidates = [(i, file_positions[line.template]) for i, line in enumerate(template_paragraphs)
+                  if not line.tags and template_counts.get(line.template) == 1 and line.template in file_positions]
+
+    # Наибольшая возрастающая подпоследовательность по номеру в документе за O(n log n)
+    tails = []
+    tail_indexes = []
+    previous = [None] * len(candidates)
+    for index, (_, j) in enumerate(candidates):
+        position = bisect.bisect_left(tails, j)
+        if position > 0:
+            previous[index] = tail_indexes[position - 1]
+        if position == len(tails):
+            tails.append(j)
+            tail_indexes.append(index)
+        else:
+            tails[position] = j
+            tail_indexes[position] = index
+
+    anchors = []
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        anchors.append(candidates[index])
+        index = previous[index]
+    return anchors[::-1]
+
+
+def align_paragraphs(template_paragraphs: list, file_paragraphs: list):
+    """
+    Функция сопоставляет параграфы документа параграфам шаблона с учетом вставленных и удаленных параграфов.
+    Выравнивание отдает приоритет строкам с метками (см. _align_gap): пустой или статичный параграф не занимает пару
+    параграфа, из которого извлекаются данные. У документа той же структуры, что и шаблон, параграфы сопоставляются
+    по порядку
+    :param template_paragraphs: список CompiledLine параграфов шаблона
+    :param file_paragraphs: список параграфов документа
+
+    :return: список пар (номер параграфа шаблона или None, номер параграфа документа или None) по порядку; None -
+    параграфу нет пары
+    """
+    return _align_gap(template_paragraphs=template_paragraphs, file_paragraphs=file_paragraphs, template_start=0,
+                      template_end=len(template_paragraphs), file_start=0, file_end=len(file_paragraphs), split=True)
+
+
+def extract_data(file, compiled_template: CompiledTemplate, timings=None):
+    """
+    Функция извлекает данные из файла Word по скомпилированному шаблону: из всех таблиц (ячейки с метками
+    сопоставляются по номеру таблицы и координатам) и из параграфов (сопоставляются с учетом вставленных и удаленных,
+    см. align_paragraphs)
+    :param file: путь к анализируемому файлу, его содержимое или файлоподобный объект (см. docx_reader.open_source)
+    :param compiled_template: скомпилированный шаблон (см. get_compiled_template)
+    :param timings: словарь, в который записывается время этапов, с: 'read' - чтение документа, 'match' -
+    сопоставление с шаблоном (см. metrics.py); None - время не измеряется
+
+    :return: словарь вида {VARIABLE_NAME: VARIABLE_VALUE}; значения из параграфов имеют приоритет над значениями из таблиц
+    """
+    if timings is None:
+        file_paragraphs, tables_data = read_docx(file_path=file)
+        return match_document(file_paragraphs=file_paragraphs, tables_data=tables_data,
+                              compiled_template=compiled_template)
+
+    started = time.perf_counter()
+    file_paragraphs, tables_data = read_docx(file_path=file)
+    read = time.perf_counter()
+    timings['read'] = read - started
+    result = match_document(file_paragraphs=file_paragraphs, tables_data=tables_data,
+                            compiled_template=compiled_template)
+    timings['match'] = time.perf_counter() - read
+    return result
+
+
+def match_document(file_paragraphs: list, tables_data: dict, compiled_template: CompiledTemplate):
+    """
+    Функция извлекает данные из уже прочитанного документа (см. extract_data)
+    :param file_paragraphs: список параграфов документа (см. read_docx)
+    :param tables_data: словарь таблиц документа (см. read_docx)
+    :param compiled_template: скомпилированный шаблон
+
+    :return: словарь вида {VARIABLE_NAME: VARIABLE_VALUE}
+    """
+    # Значения из ячеек, расположенных позже, заменяют значения тех же меток из предыдущих ячеек
+    merged_table_data = {}
+    for table_index, coordinates, line in compiled_template.cells:
+        text = tables_data.get(table_index, {}).get(coordinates, '')
+        if text != '':
+            merged_table_data.update(line.match(text))
+
+    # Из параграфов метка получает первое найденное значение
+    abz_result = {}
+    template_paragraphs = compiled_template.paragraphs
+    for i, j in align_paragraphs(template_paragraphs=template_paragraphs, file_paragraphs=file_paragraphs):
+        if i is not None and j is not None:
+            for key, value in template_paragraphs[i].match(file_paragraphs[j]).items():
+                abz_result.setdefault(key, value)
+
+    return {**merged_table_data, **abz_result}
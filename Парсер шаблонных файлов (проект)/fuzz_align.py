@@ -0,0 +1,148 @@
+"""
+Проверка сопоставления параграфов (align_paragraphs) на случайных правках: из шаблона со строками с метками,
+статичными и пустыми строками строится документ, в который вставляются и из которого удаляются параграфы. Каждая
+строка с меткой, параграф которой остался в документе, должна получить свое значение. Кроме того, проверяется время
+на длинных документах без уникальных статичных строк и с большим числом вставок (см. TIMING_CASES). При ошибках
+выводятся первые несоответствия, код завершения - 1:
+
+    python fuzz_align.py
+    python fuzz_align.py --cases 10000 --seed 7
+"""
+import argparse
+import random
+import sys
+import time
+
+from extractor import CompiledLine, CompiledTemplate, match_document
+
+# Правка из замечания: удалена одна пустая строка, значения DATE и SELLER терялись
+EXAMPLE_TEMPLATE = ['Договор № <NUM>', '', 'г. Москва <DATE>', '', 'Продавец: <SELLER>', '', 'Покупатель: <BUYER>']
+EXAMPLE_DOCUMENT = ['Договор № 15', 'г. Москва 01.02.2024', '', 'Продавец: ООО Ромашка', '', 'Покупатель: ИП Иванов']
+
+# Вставляемые параграфы: пустые, повторы статичных строк и текст, не соответствующий ни одной строке шаблона
+INSERTED = ['', '', 'Статичный 0', 'Статичный 1', 'Пункт: вставка.', 'Произвольный текст']
+
+# Проверка времени: (параграфов шаблона, вставленных параграфов, бюджет, с). Без опорных точек такой документ
+# слишком велик для выравнивания динамическим программированием и сопоставляется жадно
+TIMING_CASES = [(10000, 500, 1.0), (5000, 2000, 1.0)]
+
+
+def compile_paragraphs(paragraphs):
+    template = CompiledTemplate.restore(path='', separator_left='<', separator_right='>', content_hash='',
+                                        paragraphs=[CompiledLine(template=text, separator_left='<',
+                                                                 separator_right='>') for text in paragraphs],
+                                        tables={})
+    return template
+
+
+def random_case(rng):
+    """
+    Функция строит случайный шаблон и документ с правками
+
+    :return: кортеж (параграфы шаблона, параграфы документа, ожидаемый словарь значений)
+    """
+    template = []
+    document = []
+    for i in range(rng.randint(3, 60)):
+        kind = rng.random()
+        if kind < 0.25:
+            text = f'Статичный {rng.randint(0, 3)}'
+            template.append(text)
+            document.append(text)
+        elif kind < 0.5:
+            template.append('')
+            document.append('')
+        else:
+            template.append(f'Пункт {i}: <T{i}>.')
+            document.append(f'Пункт {i}: значение {i}.')
+
+    # Номер строки шаблона для каждого параграфа документа (None - вставленный параграф)
+    origins = list(range(len(document)))
+    for _ in range(rng.randint(1, 6)):
+        position = rng.randint(0, len(document))
+        if rng.random() < 0.5 or not document:
+            document.insert(position, rng.choice(INSERTED))
+            origins.insert(position, None)
+        else:
+            position = min(position, len(document) - 1)
+            del document[position]
+            del origins[position]
+
+    expected = {}
+    for origin in origins:
+        if origin is not None and template[origin].startswith('Пункт'):
+            expected[f'T{origin}'] = f'значение {origin}'
+    return template, document, expected
+
+
+def timing_case(rng, size, inserts):
+    """
+    Функция строит длинный шаблон из строк с метками и пустых строк (без уникальных статичных строк) и документ
+    со вставками
+
+    :return: кортеж (параграфы шаблона, параграфы документа, ожидаемый словарь значений)
+    """
+    template = []
+    document = []
+    expected = {}
+    for i in range(size):
+        if i % 3 == 0:
+            template.append('')
+            document.append('')
+        else:
+            template.append(f'Пункт {i}: <T{i}>.')
+            document.append(f'Пункт {i}: значение {i}.')
+            expected[f'T{i}'] = f'значение {i}'
+    for _ in range(inserts):
+        document.insert(rng.randint(0, len(document)), rng.choice(['', 'Произвольный текст']))
+    return template, document, expected
+
+
+def check(template, document, expected):
+    """
+    :return: словарь меток с неверным значением {метка: (ожидаемое значение, полученное значение)}
+    """
+    result = match_document(file_paragraphs=document, tables_data={}, compiled_template=compile_paragraphs(template))
+    return {tag: (value, result.get(tag)) for tag, value in expected.items() if result.get(tag) != value}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Проверка сопоставления параграфов на случайных правках')
+    parser.add_argument('--cases', type=int, default=3000, help='количество случайных документов')
+    parser.add_argument('--seed', type=int, default=0, help='начальное значение генератора')
+    args = parser.parse_args(argv)
+
+    failures = []
+    example = check(template=EXAMPLE_TEMPLATE, document=EXAMPLE_DOCUMENT,
+                    expected={'NUM': '15', 'DATE': '01.02.2024', 'SELLER': 'ООО Ромашка', 'BUYER': 'ИП Иванов'})
+    if example:
+        failures.append((EXAMPLE_TEMPLATE, EXAMPLE_DOCUMENT, example))
+
+    rng = random.Random(args.seed)
+    for _ in range(args.cases):
+        template, document, expected = random_case(rng)
+        wrong = check(template=template, document=document, expected=expected)
+        if wrong:
+            failures.append((template, document, wrong))
+
+    slow = []
+    for size, inserts, budget in TIMING_CASES:
+        template, document, expected = timing_case(rng=rng, size=size, inserts=inserts)
+        started = time.perf_counter()
+        wrong = check(template=template, document=document, expected=expected)
+        elapsed = time.perf_counter() - started
+        print(f'Параграфов: {size}, вставок: {inserts}: {elapsed:.2f} с (бюджет {budget:.1f} с), '
+              f'неверных значений: {len(wrong)}')
+        if elapsed > budget or wrong:
+            slow.append((size, inserts))
+
+    for template, document, wrong in failures[:5]:
+        print('Шаблон:  ', template)
+        print('Документ:', document)
+        print('Неверно: ', wrong)
+    print(f'Проверено документов: {args.cases + 1}, с ошибками: {len(failures)}')
+    return 1 if failures or slow else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
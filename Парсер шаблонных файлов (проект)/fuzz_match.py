@@ -0,0 +1,90 @@
+"""
+Проверка сопоставления строки с шаблоном (CompiledLine.match) на случайных строках: результат сравнивается с прежней
+реализацией на регулярном выражении с ленивыми группами (fullmatch). Строки и шаблоны строятся из маленького
+алфавита, чтобы статичные части часто повторялись внутри значений. При расхождениях выводятся первые из них, код
+завершения - 1:
+
+    python fuzz_match.py
+    python fuzz_match.py --cases 1000000 --seed 7
+"""
+import argparse
+import random
+import re
+import sys
+
+from extractor import CompiledLine
+
+# Пары сепараторов, в том числе из нескольких символов и из специальных символов регулярных выражений
+SEPARATORS = [('<', '>'), ('{{', '}}'), ('[', ']'), ('(*', '*)')]
+
+ALPHABET = 'ab ,.\n'
+
+
+def regex_match(template: str, string: str, separator_left: str, separator_right: str):
+    """
+    Прежняя реализация CompiledLine.match: якорное регулярное выражение, на месте каждой метки - ленивая группа .+?
+    """
+    parts = re.split(rf'{re.escape(separator_left)}(.*?){re.escape(separator_right)}', template)
+    tags = parts[1::2]
+    pattern = re.escape(parts[0])
+    for index in range(len(tags)):
+        pattern += f'(?P<tag_{index}>.+?)' + re.escape(parts[2 * index + 2])
+
+    found = re.fullmatch(pattern, string, re.DOTALL)
+    if found is None:
+        return {}
+    return {tag: found.group(f'tag_{index}') for index, tag in enumerate(tags) if tag != ''}
+
+
+def random_text(rng, size):
+    return ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, size)))
+
+
+def random_case(rng):
+    """
+    :return: кортеж (строка-шаблон, строка документа, сепаратор слева, сепаратор справа)
+    """
+    separator_left, separator_right = rng.choice(SEPARATORS)
+    parts = [random_text(rng, 4)]
+    for index in range(rng.randint(0, 4)):
+        # Повторяющиеся и пустые имена меток встречаются в шаблонах, поэтому проверяются и они
+        tag = rng.choice([f'T{index}', 'T0', ''])
+        parts.append(separator_left + tag + separator_right + random_text(rng, 4))
+    template = ''.join(parts)
+
+    if rng.random() < 0.7:
+        # Документ, заполненный по шаблону, иногда с лишними или недостающими символами
+        string = re.sub(rf'{re.escape(separator_left)}.*?{re.escape(separator_right)}',
+                        lambda _: random_text(rng, 5), template)
+        if rng.random() < 0.2:
+            position = rng.randint(0, len(string))
+            string = string[:position] + random_text(rng, 2) + string[position + 1:]
+    else:
+        string = random_text(rng, 12)
+    return template, string, separator_left, separator_right
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Сравнение CompiledLine.match с регулярным выражением')
+    parser.add_argument('--cases', type=int, default=200000, help='количество случайных строк')
+    parser.add_argument('--seed', type=int, default=0, help='начальное значение генератора')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    differences = []
+    for _ in range(args.cases):
+        template, string, separator_left, separator_right = random_case(rng)
+        line = CompiledLine(template=template, separator_left=separator_left, separator_right=separator_right)
+        expected = regex_match(template=template, string=string, separator_left=separator_left,
+                               separator_right=separator_right)
+        if line.match(string) != expected:
+            differences.append((template, string, expected, line.match(string)))
+
+    for template, string, expected, got in differences[:5]:
+        print(f'Шаблон: {template!r}, строка: {string!r}, ожидалось: {expected}, получено: {got}')
+    print(f'Проверено строк: {args.cases}, расхождений: {len(differences)}')
+    return 1 if differences else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
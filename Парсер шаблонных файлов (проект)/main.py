@@ -1,34 +1,26 @@
 import os
 import shutil
-import sqlite3
 import tkinter as tk
-from tkinter import ttk
-import re
-import docx
-import win32clipboard
-import json
-import csv
-import pandas as pd
+from tkinter import ttk, messagebox
 import sys
-
-
-def to_json(data, filename):
-    with open(filename, "w") as f:
-        json.dump(data, f)
-
-
-def to_csv(data, filename):
-    with open(filename, 'w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(data.keys())
-        writer.writerow(data.values())
-
-
-def to_excel(data, filename):
-    df = pd.DataFrame([data])
-    writer = pd.ExcelWriter(filename)
-    df.to_excel(writer, index=False)
-    writer.save()
+import time
+import threading
+import multiprocessing
+from queue import Queue, Empty
+from extractor import get_compiled_template, align_paragraphs
+from docx_reader import read_paragraphs, extract_tables_from_docx
+from batch import run_batch
+from result_cache import ResultCache
+from metrics import RunMetrics
+from router import AUTO_TEMPLATE, build_index
+from writers import RunWriter, write_result
+from database import get_connection, get_template_settings, save_template_settings
+
+# Метрики запусков из интерфейса: у окна без консоли нет stdout, поэтому время этапов каждого документа и итог
+# запуска дописываются в файл (см. metrics.RunMetrics). Файл больше METRICS_MAX_BYTES перед запуском переименовывается
+# в metrics.jsonl.1, поэтому рядом с программой хранится не больше двух файлов метрик
+METRICS_PATH = 'metrics.jsonl'
+METRICS_MAX_BYTES = 4 * 1024 * 1024
 
 
 def find_docx_shablons():
@@ -44,148 +36,14 @@ def find_docx_shablons():
     return files
 
 
-def read_paragraphs(doc_path):
-    """
-    Функция возвращает список параграфов текста (note: игнорирует таблицы)
-    :param doc_path: путь к анализиуемому файлу
-
-    :return: список строк, где каждая строка - один параграф
-    """
-
-    paragraphs = []
-    document = docx.Document(doc_path)
-    for i in document.paragraphs:
-        paragraphs.append(i.text)
-    return paragraphs
-
-
-def replace_variables(string: str, separator_left: str, separator_right: str):
-    """
-    Функция заменяет сочетания символов, окруженные сепараторами (метки), на символ & (например, "основанный в <YEAR> году" -> "основанный в & году")
-    :param string: анализируемая строка
-    :param separator_left: сепаратор слева от заменяемого сочетания символов
-    :param separator_right: сепаратор справа от заменяемого сочетания символов
-
-    :return: входная строка с замененными метками на символ &
-    """
-    return re.sub(rf'{separator_left}.*?{separator_right}', '&', string)
-
-
-def get_data_from_string(template: str, string: str, separator_left: str, separator_right: str):
-    """
-    Функция извлекает данные из шаблонной строки методом вычитания статичных сочетаний символов:
-
-    :param template: размеченная строка-шаблон (например, "<SELLER>, выступающий от лица компании <COMPANY_NAME> на основании <ORDER_NUMBER>", где <SELLER>, <COMPANY_NAME> и <ORDER_NUMBER> стоят на месте изменяемых частей строки, а ", выступающий от лица компании " и " на основании " - статичные части строки)
-    :param string: анализируемая строка документа, из которой необходимо извлечь данные по шаблону. Например, "Иванов Иван Иванович, выступающий от лица компании 3D PlastPrint на основании приказа №IN027/SEL0523", где фрагменты "Иванов Иван Иванович", "3D PlastPrint" и "приказа №IN027/SEL0523" будут извлечены под именами переменных <SELLER>, <COMPANY_NAME> и <ORDER_NUMBER> соответственно.
-    :param separator_left: символ или сочетание символов, ограничивающее метку переменной слева. В приведенном выше примере это "<"
-    :param separator_right: символ или сочетание символов, ограничивающее метку переменной справа. В приведенном выше примере это ">"
-
-    :return: словарь вида {VARIABLE_NAME: VARIABLE_VALUE}, где VARIABLE_NAME - имя переменной, полученное из размеченного шаблона, VARIABLE_VALUE - значение данной переменной, полученное из анализируемой строки. В случае приведенного выше примера будет возвращен словарь {"SELLER": "Иванов Иван Иванович", "COMPANY_NAME": "3D PlastPrint", "ORDER_NUMBER": "приказа №IN027/SEL0523"}
-    """
-
-    def find_tags_in_string(string, sep_l, sep_r):
-        """
-        Функция возвращает список всех сочетаний символов, окруженных сепараторами (меток), (например, "основанный в <YEAR> году" -> ["YEAR"]):
-
-        :param string: анализируемая строка
-        :param sep_left: сепаратор слева от метки
-        :param sep_right: сепаратор справа от метки
-
-        :return: список тегов в строке
-        """
-
-        tag_pattern = re.compile(rf'{sep_l}.*?{sep_r}')
-
-        tags = tag_pattern.findall(string)
-
-        result_tags = []
-        for tag in tags:
-            result_tags.append(tag.replace(sep_l, '').replace(sep_r, ''))
-
-        return result_tags
-
-    static = replace_variables(string=template, separator_left=separator_left, separator_right=separator_right)
-    for i in static.split('&'):
-        if i != '' and i in string:
-            string = string.replace(i, '|')
-    values = string.split('|')
-    variables = find_tags_in_string(string=template, sep_l=separator_left, sep_r=separator_right)
-    dict = {}
-    for elem in variables:
-        if elem == '':
-            variables.remove(elem)
-    for elem in values:
-        if elem == '':
-            values.remove(elem)
-
-    if len(values) == len(variables):
-        i = 0
-        while i < len(values):
-            dict[variables[i]] = values[i]
-            i += 1
-    return dict
-
-
-def find_tags_in_string(string, sep_l, sep_r):
-    """
-    Функция возвращает список всех сочетаний символов, окруженных сепараторами (меток), (например, "основанный в <YEAR> году" -> ["YEAR"])
-    :param string: анализируемая строка
-    :param sep_left: сепаратор слева от метки
-    :param sep_right: сепаратор справа от метки
-
-    :return: список тегов в строке
-    """
-
-    tag_pattern = re.compile(rf'{sep_l}.*?{sep_r}')
-
-    tags = tag_pattern.findall(string)
-
-    result_tags = []
-    for tag in tags:
-        result_tags.append(tag.replace(sep_l, '').replace(sep_r, ''))
-
-    return result_tags
-
-
-def extract_tables_from_docx(file_path):
-    """
-    Функция извлекает содержимое ячеек всех таблиц файла Word
-    :param file_path: путь к файлу, содержимое таблиц которого необходимо извлечь
-
-    :return: словарь вида {'порядковый номер таблицы в документе': {'номер строки*номер столбца': содержимое ячейки}}
-    """
-
-    doc = docx.Document(file_path)
-    tables_data = {}
-
-    table_index = 1
-    for table in doc.tables:
-        table_data = {}
-        for row_index, row in enumerate(table.rows):
-            for cell_index, cell in enumerate(row.cells):
-                table_data[f'{row_index + 1}*{cell_index + 1}'] = cell.text
-        tables_data[table_index] = table_data
-        table_index += 1
-
-    return tables_data
-
-
 class App:
     def __init__(self):
-        if os.path.exists("settings.db"):
-            try:
-                self.conn = sqlite3.connect("settings.db")
-                self.cursor = self.conn.cursor()
-            except:
-                print('Не удалось открыть базу данных')
-        else:
-            try:
-                self.conn = sqlite3.connect("settings.db")
-                self.cursor = self.conn.cursor()
-                self.cursor.execute('''CREATE TABLE templates (template text, separator_left, separator_right text)''')
-                self.conn.commit()
-            except:
-                print("Не удалось создать базу данных")
+        try:
+            # Открывает (или создает) базу настроек и приводит ее схему к текущей версии
+            self.conn = get_connection()
+            self.cursor = self.conn.cursor()
+        except:
+            print('Не удалось открыть базу данных')
 
         self.root = tk.Tk()
         self.root.title("v 1.0.2")
@@ -230,31 +88,21 @@ class App:
             table_data = []
 
             if copied_file.startswith('templates'):
-                conn = sqlite3.connect('settings.db')
-                c = conn.cursor()
-
-                c.execute(f"DELETE FROM templates WHERE template LIKE '%{copied_file}%'")
-                c.execute("INSERT INTO templates VALUES(?, ?, ?)", (copied_file, sep_l, sep_r))
-
-                conn.commit()
-                conn.close()
-
-                tables_data = extract_tables_from_docx(file_path=file)
-                tables = list(tables_data.keys())
-                for i in tables:
-                    for a in list(tables_data[i].keys()):
-                        cell_static_text = replace_variables(string=tables_data[i][a], separator_left=sep_l,
-                                                             separator_right=sep_r).split("&")
-                        for b in cell_static_text:
+                save_template_settings(template=copied_file, separator_left=sep_l, separator_right=sep_r)
+
+                # Шаблон компилируется и сохраняется в базу при регистрации, поэтому при обработке файлов
+                # он уже не разбирается заново; статичный текст для таблиц ниже берется из скомпилированных строк
+                compiled_template = get_compiled_template(path=copied_file, separator_left=sep_l,
+                                                          separator_right=sep_r)
+                for i, cells in compiled_template.tables.items():
+                    for a, line in cells.items():
+                        for b in line.fragments or ['']:
                             table_data.append((copied_file, i, a, b))
 
-                paragraphs = read_paragraphs(doc_path=file)
-                for paragraph in paragraphs:
-                    if paragraph != '':
-                        static_variables = replace_variables(string=paragraph, separator_left=sep_l,
-                                                             separator_right=sep_r).split('&')
-                        for i in static_variables:
-                            paragraph_data.append((copied_file, paragraph, i))
+                for line in compiled_template.paragraphs:
+                    if line.template != '':
+                        for i in line.fragments or ['']:
+                            paragraph_data.append((copied_file, line.template, i))
             if paragraph_data != []:
                 table = ttk.Treeview(self.root, columns=("Файл", "Параграф", "Статичный текст"), show="headings")
 
@@ -327,6 +175,8 @@ class App:
             sep_right.place(x=330, y=110, width=40)
 
             def insert_from_clipboard():
+                import win32clipboard
+
                 win32clipboard.OpenClipboard()
                 data = win32clipboard.GetClipboardData()
                 win32clipboard.CloseClipboard()
@@ -351,15 +201,8 @@ class App:
 
         def show_template(file):
             def extract_rows_from_database(template_name):
-                conn = sqlite3.connect('settings.db')
-                c = conn.cursor()
-
-                c.execute(f"SELECT * FROM templates WHERE template LIKE '%{template_name}%'")
-                templates_rows = c.fetchall()
-
-                conn.close()
-
-                return templates_rows
+                templates_hits = get_template_settings(template='templates/' + template_name)
+                return [] if templates_hits is None else [templates_hits]
 
             self.clear_window()
             self.templates()
@@ -418,98 +261,134 @@ class App:
 
     def get_data(self):
         def start(queue):
-            for data in queue:
-                file, template = data
-                template = 'templates/' + template
-
-                conn = sqlite3.connect('settings.db')
-                c = conn.cursor()
-
-                c.execute(f"SELECT * FROM templates WHERE template LIKE '%{template}%'")
-                templates_hits = c.fetchone()
-
-                conn.commit()
-                conn.close()
-
+            def compile_templates(jobs):
+                compiled_templates = {}
+                # Файлы с шаблоном, который не удалось загрузить, дают пустой результат, а шаблон попадает в errors
+                for template in set(template for _, template in jobs):
+                    if template == AUTO_TEMPLATE:
+                        continue
+                    try:
+                        templates_hits = get_template_settings(template='templates/' + template)
+                        if templates_hits is None:
+                            raise ValueError('шаблон не зарегистрирован')
+                        compiled_templates[template] = get_compiled_template(path='templates/' + template,
+                                                                             separator_left=templates_hits[1],
+                                                                             separator_right=templates_hits[2])
+                    except Exception as e:
+                        errors.append(f'Не удалось загрузить шаблон {template}: {e}')
+                return compiled_templates
+
+            def run(jobs):
+                # Выполняется в фоновом потоке: к виджетам не обращается, только отправляет события в events
+                started = time.perf_counter()
+                done = 0
+                run_writer = None
                 try:
-                    tables_data = extract_tables_from_docx(file_path=file)
-                    template_tables_data = extract_tables_from_docx(file_path=template)
-                    tables = list(tables_data.keys())
-                    template_tables = list(template_tables_data.keys())
-                    table_values = []
-                    table_variables = []
-                    tt = []
-                    t = []
-                    for key in tables:
-                        t.append(tables_data[key])
-                        for k in list(tables_data[key].keys()):
-                            if tables_data[key][k] != '' and tables_data[key][k] not in table_values:
-                                table_values.append(tables_data[key][k])
-                    for key in template_tables:
-                        tt.append(template_tables_data[key])
-                        for k in list(template_tables_data[key].keys()):
-                            if template_tables_data[key][k] != '' and template_tables_data[key][
-                                k] not in table_variables:
-                                table_variables.append(template_tables_data[key][k])
-                    pre_table_data = []
-                    for h in list(t[0].keys()):
-                        if t[0][h] != '' and tt[0][h] != '':
-                            pre_table_data.append(get_data_from_string(template=tt[0][h],
-                                                                       string=t[0][h],
-                                                                       separator_left=templates_hits[1],
-                                                                       separator_right=templates_hits[2]))
-                    table_data = []
-                    for item in pre_table_data:
-                        if item != {}:
-                            table_data.append(item)
-
-                    def merge_dicts_from_list(dict_list):
-                        result_dict = {}
-                        for d in dict_list:
-                            result_dict.update(d)
-                        return result_dict
-
-                    merged_table_data = merge_dicts_from_list(table_data)
-                except:
-                    merged_table_data = {}
+                    compiled_templates = compile_templates(jobs)
+                    index = None
+                    if any(template == AUTO_TEMPLATE for _, template in jobs):
+                        # Файлам с шаблоном «Автоматически» шаблон подбирается по индексу зарегистрированных
+                        # шаблонов в процессе-обработчике, который читает файл один раз; файл, для которого шаблон
+                        # не подобран, дает ошибку и пустой результат
+                        index, indexed_templates = build_index()
+                        compiled_templates.update(indexed_templates)
+
+                    if combined:
+                        # Сводные файлы results.* сохраняются в папку первого файла очереди
+                        fieldnames = [tag for compiled in compiled_templates.values() for tag in compiled.tags]
+                        run_writer = RunWriter(path=os.path.join(os.path.dirname(jobs[0][0]), 'results'),
+                                               fieldnames=list(dict.fromkeys(fieldnames)), formats=formats)
+
+                    for file, template, result, error in run_batch(jobs=jobs, compiled_templates=compiled_templates,
+                                                                   cancel=cancel, result_cache=result_cache,
+                                                                   run_metrics=run_metrics, index=index):
+                        if error is not None:
+                            errors.append(f'Не удалось обработать файл {file}: {error}')
+                            result = {}
+
+                        try:
+                            if run_writer is not None:
+                                run_writer.write(file=file, data=result)
+                            else:
+                                if '.docx' in file:
+                                    path = file.replace('.docx', '')
+                                elif '.doc' in file:
+                                    path = file.replace('.doc', '')
+                                else:
+                                    path = 'results'
+                                write_result(data=result, path=path, formats=formats)
+                        except Exception as e:
+                            # Ошибка записи результатов одного файла не прерывает обработку остальных
+                            errors.append(f'Не удалось записать результаты файла {file}: {e}')
+
+                        done += 1
+                        events.put((done, time.perf_counter() - started, False))
+                except Exception as e:
+                    errors.append(f'Обработка прервана: {e}')
+                finally:
+                    if run_writer is not None:
+                        try:
+                            run_writer.close()
+                        except Exception as e:
+                            errors.append(f'Не удалось сохранить сводные файлы: {e}')
+                    try:
+                        run_metrics.close()
+                    except Exception as e:
+                        errors.append(f'Не удалось записать метрики в {METRICS_PATH}: {e}')
+                    events.put((done, time.perf_counter() - started, True))
+
+            def poll():
+                # Выполняется в потоке интерфейса через root.after
+                finished = False
+                done, elapsed = 0, 0
+                while True:
+                    try:
+                        done, elapsed, finished = events.get_nowait()
+                    except Empty:
+                        break
+                    if progress.winfo_exists():
+                        progress['value'] = done
+                        speed = done / elapsed if elapsed > 0 else 0
+                        status.config(text=f'{done}/{len(jobs)}, {speed:.1f} файл/с')
+
+                if not finished:
+                    self.root.after(100, poll)
+                    return
+                if status.winfo_exists():
+                    status.config(text=f'{"Остановлено" if cancel.is_set() else "Готово"}: {done}/{len(jobs)}, '
+                                       f'из кэша: {result_cache.hits}, {elapsed:.1f} с')
+                if start_button.winfo_exists():
+                    start_button.config(text='Старт', command=lambda: start(queue=queue))
+                if errors:
+                    # Показываются первые ошибки, чтобы окно сообщения не вышло за пределы экрана
+                    messagebox.showwarning(title='Ошибки обработки', message='\n'.join(
+                        errors[:10] + ([f'... и еще {len(errors) - 10}'] if len(errors) > 10 else [])))
+
+            if queue == [] or not any(selected.get() for selected in output_formats.values()):
+                return
+
+            jobs = list(queue)
+            combined = combined_output.get()
+            formats = [name for name, selected in output_formats.items() if selected.get()]
+            cancel = threading.Event()
+            events = Queue()
+            # Ошибки запуска: дописываются фоновым потоком и показываются по завершении (см. poll)
+            errors = []
+            result_cache = ResultCache()
+            try:
+                run_metrics = RunMetrics(path=METRICS_PATH, mode='a', max_bytes=METRICS_MAX_BYTES)
+            except OSError:
+                # Папка программы может быть недоступна для записи: метрики тогда не сохраняются
+                run_metrics = RunMetrics()
 
-                try:
-                    file_paragraphs = read_paragraphs(doc_path=file)
-                    template_paragraphs = read_paragraphs(doc_path=template)
-                    i = 0
-                    pre_data = []
-
-                    while i < len(file_paragraphs):
-                        pre_data.append(get_data_from_string(template=template_paragraphs[i], string=file_paragraphs[i],
-                                                             separator_left=templates_hits[1],
-                                                             separator_right=templates_hits[2]))
-                        i += 1
-                    data = []
-                    abz_result = {}
-                    for item in pre_data:
-                        if item != {}:
-                            data.append(item)
-                    for item in data:
-                        keys = list(item.keys())
-                        for key in keys:
-                            if key not in list(abz_result.keys()):
-                                abz_result[key] = item[key]
-                except:
-                    abz_result = {}
-
-                def merge_dicts(dict1, dict2):
-                    return {**dict1, **dict2}
-
-                if '.docx' in file:
-                    path = file.replace('.docx', '')
-                elif '.doc' in file:
-                    path = file.replace('.doc', '')
-                else:
-                    path = 'results'
-                result = merge_dicts(dict1=merged_table_data, dict2=abz_result)
-                to_csv(data=result, filename=path + '.csv')
-                to_excel(data=result, filename=path + '.xlsx')
-                to_json(data=result, filename=path + '.json')
+            progress = ttk.Progressbar(self.root, maximum=len(jobs))
+            progress.place(x=10, y=275, width=250, height=18)
+            status = tk.Label(self.root, text=f'0/{len(jobs)}')
+            status.place(x=270, y=274)
+            start_button.config(text='Стоп', command=cancel.set)
+
+            threading.Thread(target=run, args=(jobs,), daemon=True).start()
+            self.root.after(100, poll)
 
         def add_to_queue(new_file: str, template: str, queue: list):
             def delete_data(event):
@@ -557,7 +436,7 @@ class App:
         queue = []
         file = tk.Entry(self.root)
         file.place(x=10, y=50, width=200)
-        templates = ttk.Combobox(self.root, values=find_docx_shablons())
+        templates = ttk.Combobox(self.root, values=[AUTO_TEMPLATE] + find_docx_shablons())
         templates.place(x=230, y=50, width=200)
         add = tk.Button(self.root, text='Добавить в очередь',
                         command=lambda: add_to_queue(new_file=file.get(), template=templates.get(),
@@ -567,7 +446,18 @@ class App:
         start_button = tk.Button(self.root, text='Старт', command=lambda: start(queue=queue))
         start_button.place(x=388, y=80)
 
+        combined_output = tk.BooleanVar()
+        combined_button = tk.Checkbutton(self.root, text='Сводный файл', variable=combined_output)
+        combined_button.place(x=10, y=80)
+
+        output_formats = {}
+        for x, name in ((10, 'csv'), (60, 'xlsx'), (115, 'json')):
+            output_formats[name] = tk.BooleanVar(value=True)
+            tk.Checkbutton(self.root, text=name.upper(), variable=output_formats[name]).place(x=x, y=98)
+
         def insert_from_clipboard():
+            import win32clipboard
+
             win32clipboard.OpenClipboard()
             data = win32clipboard.GetClipboardData()
             win32clipboard.CloseClipboard()
@@ -587,45 +477,32 @@ class App:
                     try:
                         tables_data = extract_tables_from_docx(file_path=file)
                         template_tables_data = extract_tables_from_docx(file_path=template)
-                        tables = list(tables_data.keys())
-                        template_tables = list(template_tables_data.keys())
-                        table_values = []
-                        table_variables = []
-                        tt = []
-                        t = []
-                        for key in tables:
-                            t.append(tables_data[key])
-                            for k in list(tables_data[key].keys()):
-                                if tables_data[key][k] != '' and tables_data[key][k] not in table_values:
-                                    table_values.append(tables_data[key][k])
-                        for key in template_tables:
-                            tt.append(template_tables_data[key])
-                            for k in list(template_tables_data[key].keys()):
-                                if template_tables_data[key][k] != '' and template_tables_data[key][
-                                    k] not in table_variables:
-                                    table_variables.append(template_tables_data[key][k])
                         data = []
 
-                        for h in list(t[0].keys()):
-                            if empty == True:
-                                data.append((h, tt[0][h], t[0][h]))
-                            else:
-                                if t[0][h] != '' and tt[0][h] != '':
-                                    data.append((h, tt[0][h], t[0][h]))
+                        # Ячейки всех таблиц: номер таблицы, координаты, текст ячейки шаблона и документа
+                        for i, table_data in tables_data.items():
+                            template_table_data = template_tables_data.get(i, {})
+                            for h, cell in table_data.items():
+                                template_cell = template_table_data.get(h, '')
+                                if empty == True:
+                                    data.append((f'{i}:{h}', template_cell, cell))
+                                else:
+                                    if cell != '' and template_cell != '':
+                                        data.append((f'{i}:{h}', template_cell, cell))
                     except:
                         print('Файл(-ы) невозможно прочитать или он(они) не содержат таблиц')
                         data = []
 
-                    table = ttk.Treeview(self.root, columns=("№ строки*столбца", "Шаблон", "Файл"), show="headings")
+                    table = ttk.Treeview(self.root, columns=("№ таблицы:строки*столбца", "Шаблон", "Файл"), show="headings")
 
                     for i in data:
                         table.insert("", tk.END, values=i)
 
-                    table.column("№ строки*столбца", width=140, anchor=tk.CENTER)
+                    table.column("№ таблицы:строки*столбца", width=140, anchor=tk.CENTER)
                     table.column("Шаблон", width=140, anchor=tk.CENTER)
                     table.column("Файл", width=140, anchor=tk.CENTER)
 
-                    table.heading("№ строки*столбца", text="№ строки*столбца")
+                    table.heading("№ таблицы:строки*столбца", text="№ таблицы:строки*столбца")
                     table.heading("Шаблон", text="Шаблон")
                     table.heading("Файл", text="Файл")
 
@@ -638,25 +515,23 @@ class App:
 
                 else:
                     file_paragraphs = read_paragraphs(doc_path=file)
-                    template_paragraphs = read_paragraphs(doc_path=template)
-
-                    if len(file_paragraphs) != len(template_paragraphs):
-                        if len(file_paragraphs) > len(template_paragraphs):
-                            while len(file_paragraphs) == len(template_paragraphs):
-                                template_paragraphs.append('')
-                        else:
-                            while len(template_paragraphs) > len(file_paragraphs):
-                                file_paragraphs.append('')
+                    templates_hits = get_template_settings(template=template)
+                    sep_l, sep_r = (templates_hits[1], templates_hits[2]) if templates_hits else ('<', '>')
+                    template_paragraphs = get_compiled_template(path=template, separator_left=sep_l,
+                                                                separator_right=sep_r).paragraphs
 
+                    # Параграфы показываются так же, как сопоставляются при извлечении: вставленные в документ
+                    # и удаленные из него параграфы стоят напротив пустой строки
                     data = []
-                    i = 0
-                    while i < len(file_paragraphs):
+                    for i, j in align_paragraphs(template_paragraphs=template_paragraphs,
+                                                 file_paragraphs=file_paragraphs):
+                        template_paragraph = template_paragraphs[i].template if i is not None else ''
+                        file_paragraph = file_paragraphs[j] if j is not None else ''
                         if empty != True:
-                            if template_paragraphs[i] != '' and file_paragraphs[i] != '':
-                                data.append((template_paragraphs[i], file_paragraphs[i]))
+                            if template_paragraph != '' and file_paragraph != '':
+                                data.append((template_paragraph, file_paragraph))
                         else:
-                            data.append((template_paragraphs[i], file_paragraphs[i]))
-                        i += 1
+                            data.append((template_paragraph, file_paragraph))
 
                     table = ttk.Treeview(self.root, columns=("Шаблон", "Файл"), show="headings")
 
@@ -701,6 +576,8 @@ class App:
         tk.Label(self.root, text="Отобразить").place(x=5, y=47)
 
         def insert_from_clipboard():
+            import win32clipboard
+
             win32clipboard.OpenClipboard()
             data = win32clipboard.GetClipboardData()
             win32clipboard.CloseClipboard()
@@ -726,4 +603,7 @@ class App:
         self.root.config(menu=menu)
 
 
-app = App()
+if __name__ == '__main__':
+    # Процессы-обработчики пула (см. batch.run_batch) не должны запускать интерфейс
+    multiprocessing.freeze_support()
+    app = App()
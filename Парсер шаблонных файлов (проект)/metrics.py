@@ -0,0 +1,208 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Этапы обработки в порядке вывода в сводной таблице: route - подбор шаблона для документа, hash - SHA-256 документа
+# для кэша результатов, cache - поиск в кэше результатов, read - распаковка и разбор документа (read_docx), match -
+# сопоставление с шаблоном (match_document), compile - компиляция шаблона из файла, db_read / db_write - обращения
+# к базе настроек, write - запись файлов результатов. Этапы могут быть вложенными: время db_read входит и в cache
+STAGES = ('route', 'hash', 'cache', 'read', 'match', 'compile', 'db_read', 'db_write', 'write')
+
+
+class Metrics:
+    """
+    Таймеры этапов обработки (количество вызовов и суммарное время) и счетчики событий. Изменение и чтение
+    выполняются под блокировкой: метрики процесса обновляются и из потока интерфейса, и из фонового потока обработки
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, count: int = 1):
+        """
+        Функция добавляет время этапа
+        :param stage: имя этапа (см. STAGES)
+        :param seconds: время, с
+        :param count: количество вызовов
+        """
+        with self._lock:
+            total = self.stages.setdefault(stage, [0, 0.0])
+            total[0] += count
+            total[1] += seconds
+
+    def count(self, name: str, value: int = 1):
+        """
+        Функция увеличивает счетчик
+        :param name: имя счетчика
+        :param value: приращение
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, stage: str):
+        """
+        Контекстный менеджер добавляет время выполнения блока к этапу
+        :param stage: имя этапа
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage=stage, seconds=time.perf_counter() - started)
+
+    def copy(self):
+        copied = Metrics()
+        with self._lock:
+            copied.stages = {stage: list(total) for stage, total in self.stages.items()}
+            copied.counters = dict(self.counters)
+        return copied
+
+    def since(self, earlier):
+        """
+        Функция возвращает разность с более ранним снимком (см. copy)
+        :param earlier: объект Metrics
+
+        :return: объект Metrics с этапами и счетчиками, изменившимися после снимка
+        """
+        current = self.copy()
+        delta = Metrics()
+        for stage, (count, seconds) in current.stages.items():
+            before = earlier.stages.get(stage, (0, 0.0))
+            if count != before[0]:
+                delta.add(stage=stage, seconds=seconds - before[1], count=count - before[0])
+        for name, value in current.counters.items():
+            if value != earlier.counters.get(name, 0):
+                delta.count(name=name, value=value - earlier.counters.get(name, 0))
+        return delta
+
+    def merge(self, other):
+        other = other.copy()
+        for stage, (count, seconds) in other.stages.items():
+            self.add(stage=stage, seconds=seconds, count=count)
+        for name, value in other.counters.items():
+            self.count(name=name, value=value)
+
+    def as_dict(self):
+        """
+        :return: словарь {'stages': {этап: {'count': вызовов, 'seconds': время}}, 'counters': {счетчик: значение}}
+        """
+        current = self.copy()
+        stages = sorted(current.stages,
+                        key=lambda stage: (STAGES.index(stage) if stage in STAGES else len(STAGES), stage))
+        return {'stages': {stage: {'count': current.stages[stage][0], 'seconds': round(current.stages[stage][1], 6)}
+                           for stage in stages},
+                'counters': dict(sorted(current.counters.items()))}
+
+
+# Метрики текущего процесса: сюда записываются обращения к базе настроек и запись файлов результатов
+# (см. measured), а RunMetrics берет из них разность за время запуска
+metrics = Metrics()
+
+
+def measured(stage: str):
+    """
+    Декоратор добавляет время каждого вызова функции к этапу в метриках процесса
+    :param stage: имя этапа
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with metrics.timer(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RunMetrics:
+    """
+    Метрики одного запуска: времена этапов каждого документа (по одной строке JSON на документ, если задан путь)
+    и их сумма за запуск вместе с обращениями к базе настроек и записью результатов в текущем процессе
+    """
+
+    def __init__(self, path=None, mode='w', max_bytes=None):
+        """
+        :param path: путь к файлу .jsonl для построчной записи метрик документов и итога запуска; None - не записывать
+        :param mode: режим открытия файла ('a' - дописывать, например, при наблюдении за папками)
+        :param max_bytes: размер файла, при превышении которого перед запуском он переименовывается в <путь>.1
+        (прежний <путь>.1 удаляется) и метрики записываются в новый файл; None - без ограничения
+        """
+        self.total = Metrics()
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self._process = metrics.copy()
+        if path and max_bytes is not None and os.path.exists(path) and os.path.getsize(path) > max_bytes:
+            os.replace(path, path + '.1')
+        self._file = open(path, mode, encoding='utf-8') if path else None
+
+    def add_document(self, file: str, template: str, stages: dict, error=None, cached=False):
+        """
+        Функция добавляет метрики одного документа
+        :param file: путь к документу или документ в памяти (см. batch.run_batch)
+        :param template: ключ шаблона
+        :param stages: словарь {этап: время, с}
+        :param error: текст ошибки или None
+        :param cached: True - результат взят из кэша результатов
+        """
+        for stage, seconds in stages.items():
+            self.total.add(stage=stage, seconds=seconds)
+        self.total.count('documents')
+        if error is not None:
+            self.total.count('errors')
+        if cached:
+            self.total.count('cache_hits')
+        if self._file is not None:
+            if not isinstance(file, str):
+                # Для документа в памяти записывается имя файлоподобного объекта, если оно есть, иначе - тип
+                name = getattr(file, 'name', None)
+                file = name if isinstance(name, str) else f'<{type(file).__name__}>'
+            self._file.write(json.dumps({'file': file, 'template': template, 'cached': cached, 'error': error,
+                                         'stages': {stage: round(seconds, 6) for stage, seconds in stages.items()}},
+                                        ensure_ascii=False) + '\n')
+
+    def close(self):
+        """
+        Функция завершает запуск: добавляет к итогу метрики процесса за время запуска и записывает итог в файл
+
+        :return: итог запуска (см. as_dict)
+        """
+        if self.elapsed is None:
+            self.elapsed = time.perf_counter() - self.started
+            self.total.merge(metrics.since(self._process))
+        result = self.as_dict()
+        if self._file is not None:
+            self._file.write(json.dumps({'run': result}, ensure_ascii=False) + '\n')
+            self._file.close()
+            self._file = None
+        return result
+
+    def as_dict(self):
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.started
+        return dict(self.total.as_dict(), elapsed=round(elapsed, 6))
+
+    def summary(self):
+        """
+        Функция возвращает итог запуска в виде текстовой таблицы
+
+        :return: строка
+        """
+        result = self.as_dict()
+        lines = [f'{"Этап":<14}{"Вызовов":>10}{"Всего, с":>12}{"Среднее, мс":>14}']
+        for stage, total in result['stages'].items():
+            lines.append(f'{stage:<14}{total["count"]:>10}{total["seconds"]:>12.3f}'
+                         f'{1000 * total["seconds"] / total["count"]:>14.2f}')
+        for name, value in result['counters'].items():
+            lines.append(f'{name:<14}{value:>10}')
+        lines.append(f'{"elapsed":<14}{"":>10}{result["elapsed"]:>12.3f}')
+        return '\n'.join(lines)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,79 @@
+import cProfile
+import io
+import pstats
+import tracemalloc
+
+
+class Profiler:
+    """
+    Профилирование запуска: время функций (cProfile) и выделения памяти (tracemalloc). При завершении рядом с
+    результатами записываются файлы <путь>.prof (открывается pstats, snakeviz и т.п.), <путь>.snapshot (снимок
+    tracemalloc, см. tracemalloc.Snapshot.load) и <путь>.profile.txt со сводкой: top самых долгих функций и мест
+    выделения памяти. Профилируется только текущий процесс, поэтому запуск с профилированием выполняется без пула
+    процессов
+    """
+
+    def __init__(self, path: str, top: int = 20, frames: int = 1):
+        """
+        :param path: путь к файлам профиля без расширения (например, "results/results")
+        :param top: количество функций и мест выделения памяти в сводке
+        :param frames: глубина стека, сохраняемая tracemalloc для каждого выделения памяти
+        """
+        self.path = path
+        self.top = top
+        self.frames = frames
+        self.files = []
+        self._profile = None
+        self._snapshot = None
+
+    def start(self):
+        tracemalloc.start(self.frames)
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop(self):
+        """
+        Функция останавливает профилирование и записывает файлы профиля
+
+        :return: список путей к записанным файлам
+        """
+        self._profile.disable()
+        self._snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        self._profile.dump_stats(self.path + '.prof')
+        self._snapshot.dump(self.path + '.snapshot')
+        with open(self.path + '.profile.txt', 'w', encoding='utf-8') as f:
+            f.write(self.summary(peak=peak))
+        self.files = [self.path + '.prof', self.path + '.snapshot', self.path + '.profile.txt']
+        return self.files
+
+    def summary(self, peak=None):
+        """
+        Функция возвращает сводку профиля: функции по суммарному времени с вложенными вызовами и места выделения
+        памяти по размеру памяти, не освобожденной к концу запуска
+        :param peak: пиковый размер памяти, отслеженной tracemalloc, байт
+
+        :return: строка
+        """
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=stream)
+        stats.strip_dirs().sort_stats('cumulative').print_stats(self.top)
+
+        snapshot = self._snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                                 tracemalloc.Filter(False, '<frozen *>')])
+        lines = [f'Функции (top {self.top} по суммарному времени):', stream.getvalue().strip(), '',
+                 f'Выделения памяти (top {self.top} по размеру):']
+        for statistic in snapshot.statistics('lineno')[:self.top]:
+            lines.append(f'{statistic.size / 1024:10.1f} КБ {statistic.count:8} блоков  {statistic.traceback}')
+        if peak is not None:
+            lines.append(f'Пиковый размер отслеженной памяти: {peak / 1024 / 1024:.1f} МБ')
+        return '\n'.join(lines) + '\n'
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
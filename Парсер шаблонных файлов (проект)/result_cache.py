@@ -0,0 +1,83 @@
+import json
+import sqlite3
+from extractor import EXTRACTOR_VERSION, file_hash
+from database import CACHE_PATH, load_cached_result, save_cached_result, get_result_cache_size, evict_cached_results
+
+
+class ResultCache:
+    """
+    Постоянный кэш результатов извлечения в отдельной базе (см. database.CACHE_PATH). Ключ - SHA-256 документа, хэш
+    скомпилированного шаблона и версия извлечения, поэтому документ, повторно поступивший без изменений, не
+    открывается заново. Когда суммарный размер записей превышает max_bytes, удаляются записи, к которым дольше всего
+    не обращались
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+
+    def get(self, document_hash: str, template_hash: str):
+        """
+        Функция возвращает сохраненный результат извлечения
+        :param document_hash: SHA-256 документа (см. extractor.file_hash)
+        :param template_hash: хэш скомпилированного шаблона (см. CompiledTemplate.fingerprint)
+
+        :return: словарь с данными или None при промахе
+        """
+        try:
+            data = load_cached_result(document_hash=document_hash, template_hash=template_hash,
+                                      extractor_version=EXTRACTOR_VERSION, path=self.path)
+        except sqlite3.Error as e:
+            print('Не удалось прочитать кэш результатов:', e)
+            data = None
+
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(data)
+
+    def put(self, document_hash: str, template_hash: str, result: dict):
+        """
+        Функция сохраняет результат извлечения и при переполнении вытесняет давно не использованные записи
+        :param document_hash: SHA-256 документа
+        :param template_hash: хэш скомпилированного шаблона
+        :param result: словарь с данными
+        """
+        try:
+            if self._size is None:
+                self._size = get_result_cache_size(path=self.path)[1]
+            self._size += save_cached_result(document_hash=document_hash, template_hash=template_hash,
+                                             extractor_version=EXTRACTOR_VERSION,
+                                             data=json.dumps(result, ensure_ascii=False), path=self.path)
+            if self._size > self.max_bytes:
+                evict_cached_results(max_bytes=self.max_bytes, path=self.path)
+                self._size = get_result_cache_size(path=self.path)[1]
+        except sqlite3.Error as e:
+            print('Не удалось сохранить результат в кэш:', e)
+
+    def stats(self):
+        """
+        Функция возвращает счетчики кэша
+
+        :return: словарь {'hits': попадания, 'misses': промахи, 'entries': записей, 'bytes': суммарный размер}
+        """
+        entries, size = get_result_cache_size(path=self.path)
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
+
+
+def document_hash(file):
+    """
+    Функция возвращает SHA-256 документа для поиска в кэше
+    :param file: путь к документу, его содержимое или файлоподобный объект (см. extractor.file_hash)
+
+    :return: строка из 64 шестнадцатеричных символов или None, если файл не удалось прочитать
+    """
+    try:
+        return file_hash(file)
+    except (OSError, ValueError):
+        # ValueError - файлоподобный объект уже закрыт
+        return None
@@ -0,0 +1,145 @@
+import os
+from docx_reader import read_docx
+from extractor import get_compiled_template
+from database import DB_PATH, get_templates
+from metrics import measured
+
+# Ключ шаблона в очереди, при котором шаблон для файла подбирается автоматически
+AUTO_TEMPLATE = 'Автоматически'
+
+# Длина шингла - фрагмента нормализованного статичного текста, по которому сравниваются документ и шаблоны
+SHINGLE_SIZE = 8
+
+# Минимальная уверенность (доля шинглов шаблона, найденных в документе), при которой шаблон считается подобранным
+MIN_CONFIDENCE = 0.5
+
+
+def shingles(text: str, size=SHINGLE_SIZE):
+    """
+    Функция возвращает множество шинглов строки: все подстроки длины size после приведения к нижнему регистру и
+    схлопывания пробелов
+    :param text: строка
+    :param size: длина шингла
+
+    :return: множество строк; пустое, если строка короче size
+    """
+    text = ' '.join(text.lower().split())
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class TemplateIndex:
+    """
+    Инвертированный индекс шинглов статичного текста зарегистрированных шаблонов. Документ сравнивается со всеми
+    шаблонами за один проход по своим шинглам: шаблон выбирается по коэффициенту Жаккара (общие шинглы к объединению
+    шинглов шаблона и документа), поэтому небольшой шаблон, целиком входящий в документ, не выигрывает у подробного
+    шаблона, который покрывает документ лучше. Уверенность - доля шинглов выбранного шаблона, найденных в документе.
+    Шинглы шаблона метки не затрагивают, поэтому значения, подставленные в документ, на уверенность не влияют
+    """
+
+    def __init__(self, shingle_size=SHINGLE_SIZE):
+        self.shingle_size = shingle_size
+        self._postings = {}
+        self._sizes = {}
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __iter__(self):
+        return iter(self._sizes)
+
+    def add(self, key: str, compiled_template):
+        """
+        Функция добавляет шаблон в индекс (шаблон с тем же ключом заменяется)
+        :param key: ключ шаблона
+        :param compiled_template: объект CompiledTemplate
+        """
+        self.remove(key)
+        lines = [line for table in compiled_template.tables.values() for line in table.values()]
+        lines += compiled_template.paragraphs
+        template_shingles = set()
+        for line in lines:
+            for fragment in line.fragments:
+                template_shingles |= shingles(text=fragment, size=self.shingle_size)
+
+        for shingle in template_shingles:
+            self._postings.setdefault(shingle, []).append(key)
+        self._sizes[key] = len(template_shingles)
+
+    def remove(self, key: str):
+        """
+        Функция удаляет шаблон из индекса
+        """
+        if self._sizes.pop(key, None) is None:
+            return
+        for shingle, keys in list(self._postings.items()):
+            if key in keys:
+                keys.remove(key)
+                if not keys:
+                    del self._postings[shingle]
+
+    def route_texts(self, texts):
+        """
+        Функция подбирает шаблон для документа по его текстам
+        :param texts: тексты параграфов и ячеек таблиц документа
+
+        :return: кортеж (ключ шаблона, уверенность от 0 до 1) или (None, 0.0), если ни один шаблон не подходит. При
+        равном коэффициенте Жаккара выбирается шаблон с большим числом совпавших шинглов (более подробный)
+        """
+        document_shingles = set()
+        for text in texts:
+            document_shingles |= shingles(text=text, size=self.shingle_size)
+
+        counts = {}
+        for shingle in document_shingles:
+            for key in self._postings.get(shingle, ()):
+                counts[key] = counts.get(key, 0) + 1
+
+        best, best_score = None, (0.0, 0)
+        for key, count in counts.items():
+            score = (count / (self._sizes[key] + len(document_shingles) - count), count)
+            if score > best_score:
+                best, best_score = key, score
+        if best is None:
+            return None, 0.0
+        return best, best_score[1] / self._sizes[best]
+
+    def route_document(self, file_paragraphs: list, tables_data: dict):
+        """
+        Функция подбирает шаблон для уже прочитанного документа (см. read_docx)
+        :param file_paragraphs: список параграфов документа
+        :param tables_data: словарь ячеек таблиц документа
+
+        :return: кортеж (ключ шаблона, уверенность от 0 до 1) или (None, 0.0)
+        """
+        texts = file_paragraphs + [text for table_data in tables_data.values() for text in table_data.values()]
+        return self.route_texts(texts)
+
+    @measured('route')
+    def route(self, file):
+        """
+        Функция подбирает шаблон для файла Word
+        :param file: путь к файлу, его содержимое или файлоподобный объект (см. docx_reader.open_source)
+
+        :return: кортеж (ключ шаблона, уверенность от 0 до 1) или (None, 0.0)
+        """
+        file_paragraphs, tables_data = read_docx(file_path=file)
+        return self.route_document(file_paragraphs=file_paragraphs, tables_data=tables_data)
+
+
+def build_index(db_path=DB_PATH):
+    """
+    Функция строит индекс по всем шаблонам, зарегистрированным в базе настроек, файлы которых существуют. Шаблоны
+    берутся скомпилированными из базы (см. get_compiled_template), поэтому файлы-шаблоны заново не читаются
+    :param db_path: путь к базе настроек
+
+    :return: кортеж (TemplateIndex с ключами - путями к файлам-шаблонам, словарь {путь: CompiledTemplate})
+    """
+    index = TemplateIndex()
+    compiled_templates = {}
+    for template, separator_left, separator_right in get_templates(path=db_path):
+        if not os.path.exists(template):
+            continue
+        compiled_templates[template] = get_compiled_template(path=template, separator_left=separator_left,
+                                                             separator_right=separator_right, db_path=db_path)
+        index.add(key=template, compiled_template=compiled_templates[template])
+    return index, compiled_templates
@@ -1,8 +1,12 @@
 import re
+import timeit
+
+import extractor
 
 
 def get_data_from_string(template: str, string: str, separator_left: str, separator_right: str):
     """
+    Прежняя реализация (метод вычитания статичных фрагментов), оставлена для сравнения с extractor.get_data_from_string.
     Функция принимает на вход шаблон текста, состоящий из статичных и переменных частей текста,
     анализируемую строку текста и сочетание символов, используемое в качестве ограничителей переменной в тексте шаблона:
 
@@ -42,8 +46,6 @@ def get_data_from_string(template: str, string: str, separator_left: str, separa
     for elem in values:
         if elem == '':
             values.remove(elem)
-    print(values)
-    print(variables)
     if len(values) == len(variables):
         i = 0
         while i < len(values):
@@ -52,7 +54,31 @@ def get_data_from_string(template: str, string: str, separator_left: str, separa
     return dict
 
 
-string = "Банк: <BUYER BANK>"
-new_string = "Банк: Сбер"
+# Пары (строка-шаблон, строка документа) для сравнения двух реализаций
+cases = [
+    ("Банк: <BUYER BANK>", "Банк: Сбер"),
+    ("<SELLER>, выступающий от лица компании <COMPANY_NAME> на основании <ORDER_NUMBER>",
+     "Иванов Иван Иванович, выступающий от лица компании 3D PlastPrint на основании приказа №IN027/SEL0523"),
+    # Значение содержит "|" - прежняя реализация возвращает пустой словарь
+    ("Счет: <ACCOUNT>", "Счет: 40702|810"),
+    # Статичный фрагмент повторяется внутри значения - прежняя реализация возвращает пустой словарь
+    ("<SELLER>, действующий на основании <DOCUMENT>",
+     "ООО «Ромашка», действующий на основании устава, действующий на основании доверенности"),
+    # Длинный параграф с множеством меток и такой же параграф, не соответствующий шаблону (последний символ другой)
+    (' '.join(f'поле {i}: <TAG_{i}>;' for i in range(40)),
+     ' '.join(f'поле {i}: значение {i};' for i in range(40))),
+    (' '.join(f'поле {i}: <TAG_{i}>;' for i in range(40)),
+     ' '.join(f'поле {i}: значение {i};' for i in range(40))[:-1] + '.'),
+]
+
+number = 20000
+
+for template, string in cases:
+    old = get_data_from_string(template=template, string=string, separator_left='<', separator_right='>')
+    new = extractor.get_data_from_string(template=template, string=string, separator_left='<', separator_right='>')
+    old_time = timeit.timeit(lambda: get_data_from_string(template, string, '<', '>'), number=number)
+    new_time = timeit.timeit(lambda: extractor.get_data_from_string(template, string, '<', '>'), number=number)
 
-print(get_data_from_string(template=string, string=new_string, separator_left='<', separator_right='>'))
+    print(template)
+    print(f'  вычитание:   {old_time / number * 1e6:8.2f} мкс  {old}')
+    print(f'  один проход: {new_time / number * 1e6:8.2f} мкс  {new}')
@@ -0,0 +1,89 @@
+import os
+from batch import run_batch
+from extractor import file_hash
+from database import DB_PATH, get_watch_directories, load_watch_manifest, save_watch_manifest
+
+
+def scan_directory(directory: str, template: str, manifest: dict):
+    """
+    Функция сравнивает файлы .docx папки (без вложенных папок) с манифестом. Содержимое файла хэшируется, только
+    если его время изменения или размер отличаются от записанных в манифесте
+    :param directory: путь к папке
+    :param template: шаблон, назначенный папке; при смене шаблона все файлы обрабатываются заново
+    :param manifest: манифест папки (см. load_watch_manifest)
+
+    :return: кортеж (новые и измененные файлы - список записей манифеста (путь, mtime_ns, size, content_hash, template);
+    файлы с прежним содержимым, у которых изменились только время или размер, - список записей манифеста;
+    пути к файлам, которых больше нет в папке)
+    """
+    changed = []
+    touched = []
+    seen = set()
+    for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+        if not entry.name.endswith('.docx') or entry.name.startswith('~$') or not entry.is_file():
+            continue
+        path = entry.path.replace('\\', '/')
+        seen.add(path)
+        stat = entry.stat()
+        known = manifest.get(path)
+        if known is not None and known[3] == template and known[:2] == (stat.st_mtime_ns, stat.st_size):
+            continue
+
+        try:
+            content_hash = file_hash(path)
+        except OSError:
+            # Файл удален или еще записывается - он будет обработан в следующем цикле
+            continue
+        record = (path, stat.st_mtime_ns, stat.st_size, content_hash, template)
+        if known is not None and known[2:] == (content_hash, template):
+            touched.append(record)
+        else:
+            changed.append(record)
+
+    removed = [path for path in manifest if path not in seen]
+    return changed, touched, removed
+
+
+def watch_cycle(compiled_templates: dict, on_result, db_path=DB_PATH, workers=None, chunksize=1, cancel=None,
+                result_cache=None, run_metrics=None):
+    """
+    Функция выполняет один цикл наблюдения: в каждой папке из базы настроек обрабатывает только новые и измененные
+    файлы и записывает их в манифест. Файлы, обработанные с ошибкой, тоже записываются: они будут обработаны
+    заново только после изменения
+    :param compiled_templates: словарь {путь к файлу-шаблону: CompiledTemplate} для шаблонов папок
+    :param on_result: функция (файл, словарь с данными или None, текст ошибки или None), вызывается для каждого
+    обработанного файла и возвращает True, если файл можно записать в манифест; при False (например, результаты
+    не удалось записать) файл будет обработан заново в следующем цикле
+    :param db_path: путь к базе настроек
+    :param workers: количество процессов (см. run_batch)
+    :param chunksize: количество файлов, передаваемых процессу за раз
+    :param cancel: объект threading.Event для остановки
+    :param result_cache: объект ResultCache или None
+    :param run_metrics: объект RunMetrics или None (см. run_batch)
+
+    :return: количество обработанных файлов
+    """
+    processed = 0
+    for directory, template in get_watch_directories(path=db_path):
+        if cancel is not None and cancel.is_set():
+            break
+        if not os.path.isdir(directory):
+            print('Папка не найдена:', directory)
+            continue
+
+        changed, touched, removed = scan_directory(directory=directory, template=template,
+                                                   manifest=load_watch_manifest(directory=directory, path=db_path))
+        records = {record[0]: record for record in changed}
+        entries = list(touched)
+        try:
+            for file, _, result, error in run_batch(jobs=[(path, template) for path in records],
+                                                    compiled_templates=compiled_templates, workers=workers,
+                                                    chunksize=chunksize, cancel=cancel, result_cache=result_cache,
+                                                    run_metrics=run_metrics):
+                if on_result(file, result, error):
+                    entries.append(records[file])
+                processed += 1
+        finally:
+            # Манифест сохраняется и при остановке: уже обработанные файлы не будут обработаны повторно
+            save_watch_manifest(directory=directory, entries=entries, removed=removed, path=db_path)
+    return processed
@@ -0,0 +1,147 @@
+import json
+import csv
+from metrics import metrics, measured
+
+# Зарегистрированные форматы результатов: {имя формата (оно же расширение файла): функция записи}
+writers = {}
+
+
+def register_writer(name):
+    """
+    Декоратор регистрирует функцию записи результатов одного документа под именем формата
+    :param name: имя формата, оно же расширение файла результатов
+    """
+    def decorator(function):
+        writers[name] = function
+        return function
+    return decorator
+
+
+@register_writer('json')
+def to_json(data, filename):
+    with open(filename, "w") as f:
+        json.dump(data, f)
+
+
+@register_writer('csv')
+def to_csv(data, filename):
+    with open(filename, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(data.keys())
+        writer.writerow(data.values())
+
+
+@register_writer('xlsx')
+def to_excel(data, filename):
+    # openpyxl импортируется только при первой записи в Excel; книга в режиме write-only, как в RunWriter
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(data.keys()))
+    sheet.append(list(data.values()))
+    workbook.save(filename)
+
+
+def parse_formats(formats):
+    """
+    Функция разбирает список форматов результатов, заданный строкой
+    :param formats: имена форматов через запятую (например, "json,csv")
+
+    :return: список имен форматов; ValueError, если формат не зарегистрирован
+    """
+    result = []
+    for name in formats.split(','):
+        name = name.strip().lower()
+        if name == '':
+            continue
+        if name not in writers:
+            raise ValueError(f'Неизвестный формат: {name}')
+        if name not in result:
+            result.append(name)
+    return result
+
+
+@measured('write')
+def write_result(data, path, formats):
+    """
+    Функция записывает результаты одного документа в выбранных форматах
+    :param data: словарь вида {VARIABLE_NAME: VARIABLE_VALUE}
+    :param path: путь к файлам результатов без расширения
+    :param formats: список имен форматов
+    """
+    for name in formats:
+        writers[name](data=data, filename=f'{path}.{name}')
+    metrics.count('files_written', len(formats))
+
+
+class RunWriter:
+    """
+    Сводные файлы результатов одного запуска: по одной строке на документ в общем .csv, .jsonl и .xlsx вместо
+    трех отдельных файлов на каждый документ. Строки .csv и .jsonl дописываются сразу, .xlsx заполняется в режиме
+    write-only (строки не держатся в памяти) и сохраняется при закрытии
+    """
+
+    def __init__(self, path, fieldnames, formats=('csv', 'xlsx', 'json')):
+        """
+        :param path: путь к сводным файлам без расширения (например, "results/results")
+        :param fieldnames: имена меток - столбцы сводной таблицы (см. CompiledTemplate.tags)
+        :param formats: форматы результатов; json записывается построчно в файл .jsonl
+        """
+        self.path = path
+        self.fieldnames = ['file'] + [i for i in fieldnames if i != 'file']
+        self.formats = formats
+
+        self._csv_file = None
+        self._json_file = None
+        self._workbook = None
+
+        if 'csv' in formats:
+            self._csv_file = open(path + '.csv', 'w', newline='')
+            self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=self.fieldnames, extrasaction='ignore')
+            self._csv_writer.writeheader()
+        if 'json' in formats:
+            self._json_file = open(path + '.jsonl', 'w')
+        if 'xlsx' in formats:
+            from openpyxl import Workbook
+            self._workbook = Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet()
+            self._sheet.append(self.fieldnames)
+
+    @measured('write')
+    def write(self, file, data):
+        """
+        Функция добавляет результат одного документа в сводные файлы
+        :param file: путь к исходному документу
+        :param data: словарь вида {VARIABLE_NAME: VARIABLE_VALUE}
+        """
+        row = dict(data)
+        row['file'] = file
+        if self._csv_file is not None:
+            self._csv_writer.writerow(row)
+        if self._json_file is not None:
+            self._json_file.write(json.dumps({'file': file, 'data': data}) + '\n')
+        if self._workbook is not None:
+            self._sheet.append([row.get(i, '') for i in self.fieldnames])
+        metrics.count('rows_written')
+
+    @measured('write')
+    def close(self):
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+            metrics.count('files_written')
+        if self._json_file is not None:
+            self._json_file.close()
+            self._json_file = None
+            metrics.count('files_written')
+        if self._workbook is not None:
+            self._workbook.save(self.path + '.xlsx')
+            self._workbook = None
+            metrics.count('files_written')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()